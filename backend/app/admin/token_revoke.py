@@ -1,4 +1,3 @@
-import datetime
 import flask
 import flask_admin as fadmin
 
@@ -46,36 +45,26 @@ class Admin_TokenRevoke_View(fadmin.BaseView):
                 data={'lacks': ['user_uuid', 'target_jti']})
 
         if 'user_uuid' in req_body:
-            # How this goddamn query works?!
-            query_result = db.session.query(jwt_module.RefreshToken)\
-                                .join(jwt_module.RefreshToken.usertable, aliased=True)\
-                                .filter_by(uuid=int(req_body['user_uuid'])).all()
+            query_result = db.session.query(jwt_module.RefreshToken.jti)\
+                                .filter(jwt_module.RefreshToken.user == int(req_body['user_uuid'])).all()
             if not query_result:
                 return AccountResponseCase.user_not_found.create_response(
                     message='User or JWT that mapped to that user not found')
 
-            for target in query_result:
-                # TODO: set can set multiple at once, so use that method instead
-                redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(target.jti)
-                redis_db.set(redis_key, 'revoked', datetime.timedelta(weeks=2))
-
-                if 'do_delete' in req_body:
-                    db.session.delete(target)
+            jwt_module.revoke_tokens(
+                [target.jti for target in query_result],
+                delete_refresh_token=req_body.get('do_delete', False))
         else:
-            query_result = db.session.query(jwt_module.RefreshToken)\
+            query_result = db.session.query(jwt_module.RefreshToken.jti)\
                                 .filter(jwt_module.RefreshToken.jti == int(req_body['target_jti']))\
                                 .first()
             if not query_result:
                 return AccountResponseCase.refresh_token_invalid(
                     message='RefreshToken that has such JTI not found')
 
-            redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(req_body["target_jti"])
-            redis_db.set(redis_key, 'revoked', datetime.timedelta(weeks=2))
-
-            if 'do_delete' in req_body:
-                db.session.delete(query_result)
+            jwt_module.revoke_tokens((query_result.jti, ), delete_refresh_token=req_body.get('do_delete', False))
 
-        if 'do_delete' in req_body:
+        if req_body.get('do_delete', False):
             try:
                 db.session.commit()
             except Exception:
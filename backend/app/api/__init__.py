@@ -17,6 +17,7 @@ def init_app(app: flask.Flask):
     global restapi_version
     restapi_version = app.config.get('RESTAPI_VERSION')
     app.url_map.strict_slashes = False
+    helper_class.server_header = ('Server', app.config.get('BACKEND_NAME', 'Backend Core'))
 
     allowed_origins: list = [f'https://{app.config.get("SERVER_NAME")}']
     local_client_port = app.config.get('LOCAL_DEV_CLIENT_PORT')
@@ -48,6 +49,10 @@ def init_app(app: flask.Flask):
     import app.api.project_route as project_route  # noqa
     resource_routes.update(project_route.project_resource_routes)
 
+    # JWKS must be served on well-known path, not on API path.
+    import app.api.jwks as route_jwks  # noqa
+    app.add_url_rule('/.well-known/jwks.json', view_func=route_jwks.JWKSRoute.as_view('JWKSRoute'))
+
     for path, route_model in resource_routes.items():
         view_name: str = ''
         view_func = None
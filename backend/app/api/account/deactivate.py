@@ -12,8 +12,6 @@ from app.api.response_case import CommonResponseCase
 from app.api.account.response_case import AccountResponseCase
 
 db = db_module.db
-redis_db = db_module.redis_db
-RedisKeyType = db_module.RedisKeyType
 
 
 class AccountDeactivationRoute(flask.views.MethodView, api_class.MethodViewMixin):
@@ -37,7 +35,7 @@ class AccountDeactivationRoute(flask.views.MethodView, api_class.MethodViewMixin
             - refresh_token_invalid
             - server_error
         '''
-        target_user: user_module.User = refresh_token.usertable
+        target_user: user_module.User = refresh_token.get_user()
         if target_user.email != req_body['email']:
             return AccountResponseCase.user_info_mismatch.create_response(
                         data={'fields': ['email']})
@@ -53,18 +51,14 @@ class AccountDeactivationRoute(flask.views.MethodView, api_class.MethodViewMixin
 
         try:
             # Revoke all user tokens
-            target_tokens = db.session.query(jwt_module.RefreshToken)\
-                                .filter(jwt_module.RefreshToken.user == target_user.uuid)\
-                                .all()
-            if not target_tokens:
+            target_token_jtis = db.session.query(jwt_module.RefreshToken.jti)\
+                                    .filter(jwt_module.RefreshToken.user == target_user.uuid)\
+                                    .all()
+            if not target_token_jtis:
                 # No refresh token of target user don't make any sense,
                 # how could user get here although user don't have any valid refresh token?
                 return CommonResponseCase.server_error.create_response()
-            for token in target_tokens:
-                # TODO: set can set multiple at once, so use that method instead
-                redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(token.jti)
-                redis_db.set(redis_key, 'revoked', datetime.timedelta(weeks=2))
-                db.session.delete(token)
+            jwt_module.revoke_tokens([token.jti for token in target_token_jtis])
 
             target_user.deactivated_at = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
             target_user.why_deactivated = 'ACCOUNT_LOCKED::USER_SELF_LOCKED'
@@ -41,7 +41,8 @@ class EmailActionRoute(flask.views.MethodView, api_class.MethodViewMixin):
         try:
             target_token = user.EmailToken.query_using_token(email_token)
         except jwt.exceptions.ExpiredSignatureError:
-            # TODO: We need to delete this from DB, or at least, garbage collect this.
+            # Expired token is deleted on query_using_token,
+            # and the others that nobody queried are deleted by `flask gc-expired-tokens`.
             if 'text/html' in request_content_type:
                 return AccountResponseCase.email_expired_html.create_response()
             return AccountResponseCase.email_expired.create_response()
@@ -60,7 +60,7 @@ class PasswordChangeRoute(flask.views.MethodView, api_class.MethodViewMixin):
                 if not original_password:
                     return CommonResponseCase.body_required_omitted.create_response(
                         data={'lacks': ['original_password']})
-                target_user = refresh_token.usertable
+                target_user = refresh_token.get_user()
 
             elif email_token:
                 # Change password using EmailToken Auth. Maybe user forgot their password?
@@ -36,16 +36,13 @@ class AccessTokenIssueRoute(flask.views.MethodView, api_class.MethodViewMixin):
             return AccountResponseCase.user_not_signed_in.create_response()
 
         try:
-            target_user = db.session.query(user_module.User)\
-                .filter(user_module.User.locked_at.is_(None))\
-                .filter(user_module.User.deactivated_at.is_(None))\
-                .filter(user_module.User.uuid == refresh_token.user)\
-                .first()
-            if not target_user:
+            # User is already loaded with refresh token, or restored from validation cache without DB query
+            target_user: user_module.User = refresh_token.get_user_snapshot()
+            if not target_user or target_user.locked_at or target_user.deactivated_at:
                 return AccountResponseCase.refresh_token_invalid.create_response()
 
             jwt_data_header, jwt_data_body = jwt_module.refresh_login_data(
-                                                refresh_token_cookie,
+                                                refresh_token,
                                                 req_header.get('User-Agent'),
                                                 req_header.get('X-Csrf-Token'),
                                                 req_header.get('X-Client-Token', None),
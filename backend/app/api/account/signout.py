@@ -1,4 +1,3 @@
-import datetime
 import flask
 import flask.views
 import typing
@@ -10,8 +9,6 @@ import app.database.jwt as jwt_module
 from app.api.account.response_case import AccountResponseCase
 
 db = db_module.db
-redis_db = db_module.redis_db
-RedisKeyType = db_module.RedisKeyType
 
 
 class SignOutRoute(flask.views.MethodView, api_class.MethodViewMixin):
@@ -26,18 +23,10 @@ class SignOutRoute(flask.views.MethodView, api_class.MethodViewMixin):
         if refresh_token:
             revoke_target_jti = refresh_token.jti
             try:
-                redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(revoke_target_jti)
-                redis_db.set(redis_key, 'revoked', datetime.timedelta(weeks=2))
-                print(f'Refresh token {revoke_target_jti} registered on REDIS!')
-            except Exception:
-                print('Raised error while registering token from REDIS')
-
-            try:
-                db.session.delete(refresh_token)
-                db.session.commit()
-                print(f'Refresh token {revoke_target_jti} removed!')
+                jwt_module.revoke_tokens((revoke_target_jti, ), db_commit=True)
+                print(f'Refresh token {revoke_target_jti} revoked and removed!')
             except Exception:
                 db.session.rollback()
-                print('Raised error while removing token from DB')
+                print('Raised error while revoking token')
             return AccountResponseCase.user_signed_out.create_response(message='Goodbye!')
         return AccountResponseCase.user_signed_out.create_response(message='User already signed-out')
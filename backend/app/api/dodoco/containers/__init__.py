@@ -1,8 +1,12 @@
 import app.api.dodoco.containers.containers as ddc_route_containers_main
+import app.api.dodoco.containers.container_provision_job as ddc_route_containers_pj
+import app.api.dodoco.containers.container_reconciler as ddc_route_containers_rc
 
 resource_route = {
     '/containers/<int:container_id>': {
         'view_func': ddc_route_containers_main.ContainerMainRoute,
         'base_path': '/containers/',
         'defaults': {'container_id': None}, },
+    '/containers/provision-jobs/<string:job_id>': ddc_route_containers_pj.ContainerProvisionJobRoute,
+    '/containers/reconciler': ddc_route_containers_rc.ContainerReconcilerRoute,
 }
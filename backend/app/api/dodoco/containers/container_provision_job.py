@@ -0,0 +1,33 @@
+import flask
+import flask.views
+
+import app.api.helper_class as api_class
+import app.database.jwt as jwt_module
+import app.plugin.ddc_docker.provisioner as ddc_provisioner
+
+from app.api.response_case import CommonResponseCase, ResourceResponseCase
+
+
+class ContainerProvisionJobRoute(flask.views.MethodView, api_class.MethodViewMixin):
+    @api_class.RequestHeader(auth={api_class.AuthType.Bearer: True, })
+    def get(self, job_id: str, req_header: dict, access_token: jwt_module.AccessToken):
+        '''
+        description: |
+            Returns container provisioning job status. Only admin or the user who requested the job can do this.
+            Status goes pending -> pulling -> creating -> starting -> ready, or failed on any step.
+        responses:
+            - resource_found
+            - resource_not_found
+            - server_error
+        '''
+        try:
+            job_data = ddc_provisioner.get_job(job_id)
+            # Don't let users know whether other users' jobs exist
+            if not job_data or (not access_token.is_admin() and job_data['user_id'] != access_token.user):
+                return ResourceResponseCase.resource_not_found.create_response(
+                    data={'resource_name': ['container_provision_job', ], }, )
+
+            return ResourceResponseCase.resource_found.create_response(data={'job': job_data, }, )
+
+        except Exception:
+            return CommonResponseCase.server_error.create_response()
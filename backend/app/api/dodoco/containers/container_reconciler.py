@@ -0,0 +1,29 @@
+import flask
+import flask.views
+
+import app.api.helper_class as api_class
+import app.database.jwt as jwt_module
+import app.plugin.ddc_docker.reconciler as ddc_reconciler
+
+from app.api.response_case import CommonResponseCase, ResourceResponseCase
+
+
+class ContainerReconcilerRoute(flask.views.MethodView, api_class.MethodViewMixin):
+    @api_class.RequestHeader(auth={api_class.AuthType.Bearer: True, })
+    def get(self, req_header: dict, access_token: jwt_module.AccessToken):
+        '''
+        description: Returns metrics of container reconciler. Only admin can do this.
+        responses:
+            - resource_found
+            - resource_forbidden
+            - server_error
+        '''
+        try:
+            if not access_token.is_admin():
+                return ResourceResponseCase.resource_forbidden.create_response()
+
+            return ResourceResponseCase.resource_found.create_response(
+                data={'metrics': ddc_reconciler.get_metrics(), }, )
+
+        except Exception:
+            return CommonResponseCase.server_error.create_response()
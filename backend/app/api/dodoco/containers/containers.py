@@ -19,8 +19,9 @@ class ContainerMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
     @api_class.RequestQuery(
         optional_fields={
             'all': {'type': 'boolean', },
-            'project-id': {'type': 'string', },
-            'tag-code': {'type': 'string', }, }, )
+            'project-id': {'type': 'integer', },
+            'tag-code': {'type': 'string', },
+            **api_class.pagination_query_fields, }, )
     def get(self,
             req_header: dict,
             req_query: dict,
@@ -29,6 +30,7 @@ class ContainerMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
         '''
         description: Returns container information(s).
             You can specifiy projects or tags to query containers.
+            Results are paginated, pass next_cursor of the response as cursor to get the next page.
         responses:
             - multiple_resources_found
             - resource_found
@@ -38,6 +40,8 @@ class ContainerMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
         try:
             query_all_projects = req_query.get('all', False)
             query_project_id = req_query.get('project-id', None)
+            query_limit: int = req_query.get('limit', api_class.default_page_size)
+            query_fields = api_class.parse_fields_query(req_query.get('fields', None))
 
             query_tag_code = utils.safe_json_loads(req_query.get('tag-code', None)) or req_query.get('tag_code', None)
             if query_tag_code is None:
@@ -53,17 +57,25 @@ class ContainerMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
 
             container_query = db.session.query(ddc_db_container.Container)
             container_result: list[ddc_db_container.Container] = list()
+            next_cursor: typing.Optional[int] = None
 
             if not container_id:
-                # project_uuid_query = ddc_db_project.Project.query_builder(
-                #     project_id=query_project_id, tag=query_tag_code,
-                #     user_id=access_token.user, query_all=True,
-                #     show_deleted=False, show_frozen=False,
-                #     uuid_only=True
-                # ).subquery()
-
-                # container_query = container_query.filter(ddc_db_container.Container.uuid.in_(project_uuid_query))
-                container_result = container_query.all()
+                # Limit containers to ones on projects that user can see
+                project_uuid_query = ddc_db_project.Project.query_builder(
+                    project_id=query_project_id, tag=query_tag_code,
+                    user_id=access_token.user, query_all=query_all_projects,
+                    show_deleted=False, show_frozen=False,
+                    uuid_only=True
+                ).subquery()
+
+                container_query = container_query\
+                    .filter(ddc_db_container.Container.project_id.in_(project_uuid_query))\
+                    .options(*ddc_db_container.Container.to_dict_load_options(fields=query_fields))
+                container_query = db_module.keyset_paginate(
+                    container_query, ddc_db_container.Container.uuid,
+                    req_query.get('cursor', None), query_limit)
+                container_result, next_cursor = db_module.split_keyset_page(
+                    container_query.all(), query_limit, lambda container: container.uuid)
             else:
                 container_query = container_query.filter(ddc_db_container.Container.uuid == container_id)
                 container_result = container_query.all()
@@ -74,14 +86,17 @@ class ContainerMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
                     projeect_members = target_project.members
 
                     has_auth = access_token.is_admin()
-                    has_auth = has_auth or bool([m for m in projeect_members if m.user_id != access_token.user])
+                    has_auth = has_auth or bool([m for m in projeect_members if m.user_id == access_token.user])
                     if not has_auth:
                         return ResourceResponseCase.resource_forbidden.create_response()
 
             if not container_result:
                 return ResourceResponseCase.resource_not_found.create_response()
             return ResourceResponseCase.multiple_resources_found.create_response(
-                data={'containers': [c.to_dict() for c in container_result], }, )
+                data={
+                    'containers': [c.to_dict(fields=query_fields) for c in container_result],
+                    'next_cursor': next_cursor,
+                }, )
 
         except Exception:
             return CommonResponseCase.server_error.create_response()
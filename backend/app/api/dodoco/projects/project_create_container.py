@@ -1,7 +1,5 @@
 import flask
 import flask.views
-import pathlib as pt
-import tempfile
 import typing
 
 import app.common.utils as utils
@@ -10,6 +8,10 @@ import app.database as db_module
 import app.database.jwt as jwt_module
 import app.database.dodoco.project as ddc_db_project
 import app.database.dodoco.container as ddc_db_container
+import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.provisioner as ddc_provisioner
+import app.plugin.ddc_docker.port_allocator as ddc_port_allocator
+import app.plugin.ddc_docker.warm_pool as ddc_warm_pool
 
 from app.api.response_case import CommonResponseCase, ResourceResponseCase
 
@@ -30,11 +32,20 @@ class ProjectContainerCreationRoute(flask.views.MethodView, api_class.MethodView
              access_token: jwt_module.AccessToken,
              req_body: dict):
         '''
-        description: Create container of project. Only admin or project member can do this.
+        description: |
+            Create container of project. Only admin or project member can do this.
+            If warm pool has a pre-created container of the image, it's started immediately.
+            Otherwise, container record is created immediately, and Docker container is provisioned on background.
+            Provisioning progress can be checked on /containers/provision-jobs/{job_id}.
         responses:
-            - multiple_resources_found
-            - resource_found
+            - resource_created
+            - resource_accepted
             - resource_not_found
+            - resource_forbidden
+            - resource_conflict
+            - resource_unique_failed
+            - body_bad_semantics
+            - db_error
             - server_error
         '''
         try:
@@ -69,19 +80,7 @@ class ProjectContainerCreationRoute(flask.views.MethodView, api_class.MethodView
                     data={'conflict_reason': ['CONTAINER_COUNT_LIMIT', ], }, )
 
             # Now, create a container
-            # restrict docker image to ubuntu, cuz this is just a prototype
-            docker_image_whitelist = {
-                'ubuntu': {
-                    'ports': [
-                        '22/all',  # ssh
-                    ],
-                },
-                # 'alpine',
-                # 'debian',
-                # 'centos',
-                # 'fedora',
-                # 'amazonlinux',
-            }
+            docker_image_whitelist = ddc_plugin_docker.docker_image_whitelist
             image_version = 'latest'
             image_name_split = container_start_image.split(':')
             image_base_name = image_name_split[0]
@@ -103,51 +102,43 @@ class ProjectContainerCreationRoute(flask.views.MethodView, api_class.MethodView
             new_container.description = container_description
             new_container.project_id = target_project.uuid
             new_container.created_by_id = access_token.user
+            new_container.start_image_name = image_name
             db.session.add(new_container)
-            db.session.commit()
-
-            docker_info = docker_image_whitelist['ubuntu']
-            for port_info in docker_info['ports']:
-                container_port_num, target_port_protocol = port_info.split('/')
-                container_port_num = int(container_port_num)
-                exposed_port_num = utils.find_free_random_port()
-                port_protocols = ('tcp', 'udp', ) if target_port_protocol == 'all' else (target_port_protocol, )
-
-                for port_protocol in port_protocols:
-                    new_container.add_port_mapping(
-                        container_port=container_port_num,
-                        exposed_port=exposed_port_num,
-                        protocol=ddc_db_container.DockerPortProtocol[port_protocol],
-                        db_commit=False)
-                db.session.commit()
-
-            new_container.create(
-                image_name,
-                start_after_create=True,
-                db_commit=False)
-            db.session.commit()
-
-            try:
-                tmp_script_file = tempfile.NamedTemporaryFile('w', suffix='.sh', delete=False)
-                setup_script_file = pt.Path.cwd() / 'app/plugin/ddc_docker/docker_setup_script' / 'ubuntu.sh'
-                setup_script = setup_script_file.open('r').read().format(
-                    TARGET_USERNAME='musoftware',
-                    TARGET_PASSWORD='qwerty!0')
-                print(pt.Path(tmp_script_file.name).open('w').write(setup_script))
-
-                tmpfile_pt = pt.Path(tmp_script_file.name)
-                new_container.push_local_file(tmpfile_pt, '/tmp/')
-                print(tmpfile_pt.name)
-                # new_container.execute_cmd('sh /tmp/' + tmpfile_pt.name, stream=True, demux=False)
-            except Exception as err:
-                print(utils.get_traceback_msg(err))
+            # Container and its port records are committed together below
+            db.session.flush()
+
+            # Use a pre-created container if warm pool has one, ports are already bound on it.
+            warm_container = ddc_warm_pool.claim(image_name)
+            if warm_container:
+                port_defs = warm_container['ports']
+            else:
+                try:
+                    port_defs = ddc_port_allocator.allocate_image_ports(image_base_name)
+                except ddc_port_allocator.PortExhaustedException as err:
+                    db.session.rollback()
+                    print(utils.get_traceback_msg(err))
+                    return CommonResponseCase.server_error.create_response()
+
+            for container_port_num, port_protocol, exposed_port_num in port_defs:
+                new_container.add_port_mapping(
+                    container_port=container_port_num,
+                    exposed_port=exposed_port_num,
+                    protocol=ddc_db_container.DockerPortProtocol[port_protocol],
+                    db_commit=False)
+
+            # This must be set after adding port mappings, or add_port_mapping() will recreate the container.
+            if warm_container:
+                new_container.container_id = warm_container['container_id']
+                new_container.container_name = ddc_db_container.Container.create_container_name(image_name)
 
             try:
                 db.session.commit()
-                return ResourceResponseCase.resource_created.create_response(
-                    data={'container': new_container.to_dict(), }, )
             except Exception as err:
                 db.session.rollback()
+                if warm_container:
+                    ddc_warm_pool.give_back(image_name, warm_container)
+                else:
+                    ddc_port_allocator.release(port_def[2] for port_def in port_defs)
                 err_reason, err_column_name = db_module.IntegrityCaser(err)
                 if err_reason == 'FAILED_UNIQUE':
                     return ResourceResponseCase.resource_unique_failed.create_response(
@@ -155,6 +146,22 @@ class ProjectContainerCreationRoute(flask.views.MethodView, api_class.MethodView
                 else:
                     return CommonResponseCase.db_error.create_response()
 
+            if warm_container:
+                try:
+                    ddc_warm_pool.activate_claimed_container(new_container)
+                    return ResourceResponseCase.resource_created.create_response(
+                        data={'container': new_container.to_dict(), }, )
+                except Exception as err:
+                    # Fall back to provisioning a new container
+                    print(utils.get_traceback_msg(err))
+
+            # Pulling image and creating Docker container may take minutes, so this is done on background.
+            job_id = ddc_provisioner.enqueue_job(new_container.uuid, access_token.user, image_name)
+            return ResourceResponseCase.resource_accepted.create_response(
+                data={
+                    'container': new_container.to_dict(),
+                    'job': ddc_provisioner.get_job(job_id), }, )
+
         except Exception as err:
             print(utils.get_traceback_msg(err))
             return CommonResponseCase.server_error.create_response()
@@ -8,6 +8,7 @@ import app.api.helper_class as api_class
 import app.database as db_module
 import app.database.jwt as jwt_module
 import app.database.dodoco.project as ddc_db_project
+import app.plugin.ddc_docker.provisioner as ddc_provisioner
 
 from app.api.response_case import CommonResponseCase, ResourceResponseCase
 
@@ -21,7 +22,8 @@ class ProjectMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
             'all': {'type': 'boolean', },
             'show-deleted': {'type': 'boolean', },
             'show-frozen': {'type': 'boolean', },
-            'tag-code': {'type': 'string', }, }, )
+            'tag-code': {'type': 'string', },
+            **api_class.pagination_query_fields, }, )
     def get(self,
             req_header: dict,
             req_query: dict,
@@ -30,6 +32,7 @@ class ProjectMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
         '''
         description: Returns project information(s).
             You can query projects by passing a project id, or passing a tag code.
+            Results are paginated, pass next_cursor of the response as cursor to get the next page.
         responses:
             - multiple_resources_found
             - resource_found
@@ -40,6 +43,8 @@ class ProjectMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
             show_deleted = req_query.get('show-deleted', False)
             show_frozen = req_query.get('show-frozen', False)
             query_all_projects = req_query.get('all', False)
+            query_limit: int = req_query.get('limit', api_class.default_page_size)
+            query_fields = api_class.parse_fields_query(req_query.get('fields', None))
 
             query_tag_code = utils.safe_json_loads(req_query.get('tag-code', None)) or req_query.get('tag_code', None)
             if query_tag_code is None:
@@ -57,15 +62,21 @@ class ProjectMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
                 project_id=project_id, tag=query_tag_code,
                 user_id=access_token.user, query_all=query_all_projects,
                 show_deleted=show_deleted, show_frozen=show_frozen,
-                uuid_only=False)
+                uuid_only=False,
+                cursor=req_query.get('cursor', None), limit=query_limit,
+                to_dict_kwargs={'fields': query_fields, })
 
-            project_result = project_query.all()
+            project_result, next_cursor = db_module.split_keyset_page(
+                project_query.all(), query_limit, lambda proj: proj.uuid)
             if not project_result:
                 return ResourceResponseCase.resource_not_found.create_response(
                     data={'resource_name': ['project', ], }, )
 
             return ResourceResponseCase.multiple_resources_found.create_response(
-                data={'projects': [proj.to_dict() for proj in project_result], }, )
+                data={
+                    'projects': [proj.to_dict(fields=query_fields) for proj in project_result],
+                    'next_cursor': next_cursor,
+                }, )
 
         except Exception:
             return CommonResponseCase.server_error.create_response()
@@ -188,13 +199,16 @@ class ProjectMainRoute(flask.views.MethodView, api_class.MethodViewMixin):
             # Mark it as deleted and commit it
             try:
                 project_deleted_at = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
-                target_project.freeze(project_deleted_at)
+                docker_container_ids, exposed_ports = target_project.freeze(project_deleted_at)
                 target_project.deleted_at = project_deleted_at
                 db.session.commit()
-                return ResourceResponseCase.resource_deleted.create_response()
             except Exception:
                 db.session.rollback()
                 return CommonResponseCase.db_error.create_response()
 
+            # Docker containers are removed on background, this returns once the teardown is queued.
+            ddc_provisioner.enqueue_teardown(docker_container_ids, exposed_ports)
+            return ResourceResponseCase.resource_deleted.create_response()
+
         except Exception:
             return CommonResponseCase.server_error.create_response()
@@ -1,16 +1,23 @@
-import copy
 import dataclasses
 import datetime
 import enum
 import flask
 import functools
 import inspect
+import json
 import jwt.exceptions
+import math
 import typing
 import unicodedata
-import werkzeug.datastructures as wz_dt
 import yaml
 
+import app.common.utils as utils
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 openapi_type_def: dict[type, str] = {
     str: 'string',
@@ -27,7 +34,23 @@ http_all_method = [
     'get', 'head', 'post', 'put',
     'delete', 'connect', 'options',
     'trace', 'patch']
-ResponseType = tuple[typing.Any, int, tuple[tuple[str, str]]]
+ResponseType = flask.Response
+
+# Server header is same on all responses, and this will be set on init_app() of app.api
+server_header: tuple[str, str] = ('Server', 'Backend Core')
+
+
+# Datetimes are passed to utils.json_default, so that those are serialized as HTTP date like flask.jsonify does.
+if orjson is not None:
+    orjson_option: int = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def json_dumps(data: typing.Any) -> bytes:
+        return orjson.dumps(data, default=utils.json_default, option=orjson_option)
+    json_loads = orjson.loads
+else:
+    def json_dumps(data: typing.Any) -> bytes:
+        return json.dumps(data, default=utils.json_default, ensure_ascii=False, separators=(',', ':')).encode()
+    json_loads = json.loads
 
 
 def recursive_dict_to_openapi_obj(in_dict: dict):
@@ -120,6 +143,10 @@ class Response:
     template_path: str = ''
     message: str = ''
 
+    # Pre-rendered (server header, body, headers) of the response without any overrides, see create_response().
+    _static_response: typing.Optional[tuple[tuple[str, str], bytes, list[tuple[str, str]]]] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False)
+
     def to_openapi_obj(self):
         if self.content_type == 'application/json':
             return {
@@ -161,16 +188,34 @@ class Response:
                         message: typing.Optional[str] = None,
                         template_path: str = '') -> ResponseType:
 
+        # Responses without any overrides are always same, so those are rendered only once.
+        # Server header can be changed when app is re-initialized, so rendered data is checked with it.
+        if code is None and not header and not data and message is None and not template_path\
+                and self.content_type == 'application/json':
+            static_response = self._static_response
+            if static_response is None or static_response[0] is not server_header:
+                static_response = self._static_response = (
+                    server_header,
+                    json_dumps({
+                        'success': self.success,
+                        'code': self.code,
+                        'sub_code': self.public_sub_code,
+                        'message': self.message,
+                        'data': {},
+                    }),
+                    [*self.header, server_header])
+
+            return flask.current_app.response_class(
+                static_response[1], status=self.code,
+                headers=static_response[2], mimetype='application/json')
+
         resp_code: int = code if code is not None else self.code
 
-        resp_header = header or self.header
-        result_header = wz_dt.MultiDict((
-            *resp_header,
-            ('Server', flask.current_app.config.get('BACKEND_NAME', 'Backend Core')),
-        ))
+        # Headers must be given as a list, because it can have duplicated keys like Set-Cookie.
+        result_header: list[tuple[str, str]] = [*(header or self.header), server_header]
 
-        resp_data = copy.deepcopy(data)
-        resp_data.update(data)
+        # Response data is never modified here, so it doesn't need to be copied.
+        resp_data = data
 
         resp_template_path = template_path or self.template_path
 
@@ -184,11 +229,15 @@ class Response:
                 'data': resp_data
             }
 
-            return (flask.jsonify(response_body), resp_code, result_header)
+            return flask.current_app.response_class(
+                json_dumps(response_body), status=resp_code,
+                headers=result_header, mimetype='application/json')
         elif self.content_type == 'text/html':
             if not resp_template_path:
                 raise Exception('template_path must be set when content_type is \'text/html\'')
-            return (flask.render_template(resp_template_path, **resp_data), resp_code, result_header)
+            return flask.current_app.response_class(
+                flask.render_template(resp_template_path, **resp_data), status=resp_code,
+                headers=result_header, mimetype='text/html')
         else:
             raise NotImplementedError(f'Response type {self.content_type} is not supported.')
 
@@ -245,80 +294,327 @@ class AuthType(enum.Enum):
     RefreshToken = enum.auto()
 
 
-def json_list_filter(in_list: list, filter_empty_value: bool = True) -> list:
-    result_list: list = list()
+def normalize_str(value: str) -> str:
+    # NFC normalization never changes pure ASCII strings.
+    if value.isascii():
+        return value.strip()
+    return unicodedata.normalize('NFC', value).strip()
 
-    for element in in_list:
-        if type(element) is str:
-            res_value = unicodedata.normalize('NFC', element).strip()
-            if filter_empty_value and not res_value:
-                continue
-            result_list.append(res_value)
-        elif type(element) in (int, float):
-            result_list.append(element)
-        elif type(element) is dict:
-            res_value = json_dict_filter(element)
-            if filter_empty_value and not res_value:
-                continue
-            result_list.append(res_value)
-        elif type(element) is list:
-            res_value = json_list_filter(element)
-            if filter_empty_value and not res_value:
-                continue
-            result_list.append(res_value)
-        elif type(element) is bool:
-            result_list.append(element)
-        elif element is None:
-            if filter_empty_value:
-                continue
-            result_list.append(None)
-        else:
-            raise Exception('This is not a valid list of parsed json.')
 
-    return result_list
+class RequestBodyInvalidException(Exception):
+    pass
 
 
-def json_dict_filter(in_dict: dict, filter_empty_value: bool = True) -> dict:
-    if not in_dict:
-        return dict()
+class RequestBodyLimitException(Exception):
+    pass
 
-    result_dict: dict = dict()
-    # Check value types and filter a type
+
+def json_normalize_dict(in_dict: dict, depth: int, max_depth: int, key_budget: list[int], filter_empty_value: bool):
+    if depth > max_depth:
+        raise RequestBodyLimitException(f'JSON is nested deeper than {max_depth}')
+    key_budget[0] -= len(in_dict)
+    if key_budget[0] < 0:
+        raise RequestBodyLimitException('JSON has too many keys')
+
+    # Changes are applied after iteration, as dict cannot be modified while iterating it.
+    changes: list[tuple[str, str, typing.Any, bool]] = list()
     for k, v in in_dict.items():
         # key must be a string
-        res_key: str = unicodedata.normalize('NFC', k).strip()
-        if not res_key:
-            continue
+        res_key: str = k.strip() if k.isascii() else unicodedata.normalize('NFC', k).strip()
 
-        res_value = None
         # value can be a string, number, object(dict), array(list), boolean(bool), or null(None)
-        # match case please Python 3.10
-        if type(v) is str:
-            res_value = unicodedata.normalize('NFC', v).strip()
-            if filter_empty_value and not res_value:
-                continue
-        elif type(v) in (int, float):
+        v_type = type(v)
+        if v_type is str:
+            res_value = v.strip() if v.isascii() else unicodedata.normalize('NFC', v).strip()
+            do_drop = filter_empty_value and not res_value
+        elif v_type is dict:
+            res_value = v
+            json_normalize_dict(v, depth + 1, max_depth, key_budget, filter_empty_value)
+            do_drop = filter_empty_value and not v
+        elif v_type is list:
+            res_value = v
+            json_normalize_list(v, depth + 1, max_depth, key_budget, filter_empty_value)
+            do_drop = filter_empty_value and not v
+        elif v_type in (int, float, bool):
+            res_value = v
+            do_drop = False
+        elif v is None:
             res_value = v
-        elif type(v) is dict:
-            res_value = json_dict_filter(v, filter_empty_value)
-            if filter_empty_value and not res_value:
+            do_drop = filter_empty_value
+        else:
+            raise RequestBodyInvalidException(f'{v_type.__name__} is not a valid type of parsed json')
+
+        if do_drop or not res_key or res_key is not k or res_value is not v:
+            changes.append((k, res_key, res_value, do_drop))
+
+    for k, res_key, res_value, do_drop in changes:
+        del in_dict[k]
+    for k, res_key, res_value, do_drop in changes:
+        if res_key and not do_drop:
+            in_dict[res_key] = res_value
+
+
+def json_normalize_list(in_list: list, depth: int, max_depth: int, key_budget: list[int], filter_empty_value: bool):
+    if depth > max_depth:
+        raise RequestBodyLimitException(f'JSON is nested deeper than {max_depth}')
+
+    # Compact list in place, write index never passes read index.
+    write_idx: int = 0
+    for v in in_list:
+        v_type = type(v)
+        if v_type is str:
+            v = v.strip() if v.isascii() else unicodedata.normalize('NFC', v).strip()
+            if filter_empty_value and not v:
                 continue
-        elif type(v) is list:
-            res_value = json_list_filter(v, filter_empty_value)
-            if filter_empty_value and not res_value:
+        elif v_type is dict:
+            json_normalize_dict(v, depth + 1, max_depth, key_budget, filter_empty_value)
+            if filter_empty_value and not v:
                 continue
-        elif type(v) is bool:
-            res_value = v
+        elif v_type is list:
+            json_normalize_list(v, depth + 1, max_depth, key_budget, filter_empty_value)
+            if filter_empty_value and not v:
+                continue
+        elif v_type in (int, float, bool):
+            pass
         elif v is None:
-            res_value = None
             if filter_empty_value:
                 continue
         else:
-            raise Exception('This is not a valid dict of parsed json.')
+            raise RequestBodyInvalidException(f'{v_type.__name__} is not a valid type of parsed json')
+
+        in_list[write_idx] = v
+        write_idx += 1
+    del in_list[write_idx:]
+
+
+def read_request_body(max_size: int) -> bytes:
+    '''
+    Read request body up to max_size bytes.
+    Content-Length may be missing(ex: chunked transfer encoding) or lie,
+    so at most max_size + 1 bytes are read from the stream, and RequestBodyLimitException is raised if it's longer.
+    '''
+    if (flask.request.content_length or 0) > max_size:
+        raise RequestBodyLimitException('Request body is too large')
+
+    body = flask.request.stream.read(max_size + 1)
+    if len(body) > max_size:
+        raise RequestBodyLimitException('Request body is too large')
+    return body
+
+
+def json_normalize(in_dict: dict,
+                   max_depth: int = 16,
+                   max_keys: int = 4096,
+                   filter_empty_value: bool = True) -> dict:
+    '''
+    Normalize parsed JSON object in place, with a single pass.
+    Keys and strings are NFC-normalized and stripped, and empty keys are removed.
+    Empty strings, objects, arrays and nulls are also removed if filter_empty_value is set.
+    RequestBodyLimitException will be raised if nesting depth or total number of keys exceeds the limits.
+    '''
+    if type(in_dict) is not dict:
+        raise RequestBodyInvalidException('JSON root must be an object')
+    json_normalize_dict(in_dict, 1, max_depth, [max_keys, ], filter_empty_value)
+    return in_dict
+
+
+class RequestFieldSemanticException(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason: str = reason
+
+
+# Values on query string or header are always strings,
+# so number and boolean fields accept their string forms too.
+def coerce_string(value: typing.Any) -> str:
+    if type(value) is not str:
+        raise RequestFieldSemanticException('NOT_A_VALID_STRING')
+    return value
+
+
+def coerce_integer(value: typing.Any) -> int:
+    if type(value) is int:
+        return value
+    if type(value) is str and value.isascii():
+        # int() also accepts forms like ' 1', '+1' and '1_000', and rejects ones like '--1' or '1e3'.
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise RequestFieldSemanticException('NOT_A_VALID_INTEGER')
+
+
+def coerce_number(value: typing.Any) -> typing.Union[int, float]:
+    if type(value) in (int, float):
+        return value
+    if type(value) is str and value.isascii():
+        try:
+            if math.isfinite(result := float(value)):
+                return result
+        except ValueError:
+            pass
+    raise RequestFieldSemanticException('NOT_A_VALID_NUMBER')
+
+
+def coerce_boolean(value: typing.Any) -> bool:
+    if type(value) is bool:
+        return value
+    if type(value) is str:
+        if (lowered_value := value.lower()) in ('true', '1'):
+            return True
+        elif lowered_value in ('false', '0'):
+            return False
+    raise RequestFieldSemanticException('NOT_A_VALID_BOOLEAN')
+
+
+field_type_coercer: dict[str, typing.Callable[[typing.Any], typing.Any]] = {
+    'string': coerce_string,
+    'integer': coerce_integer,
+    'number': coerce_number,
+    'boolean': coerce_boolean,
+}
 
-        result_dict[res_key] = res_value
 
-    return result_dict
+def compile_field_coercer(field_def: dict[str, typing.Any])\
+        -> typing.Optional[typing.Callable[[typing.Any], typing.Any]]:
+    '''
+    Build a function that coerces and validates a field value with field definition of request decorators.
+    type, minLength, maxLength, minimum, maximum and enum are checked.
+    Returns None if there's nothing to check on the field.
+    '''
+    checkers: list[typing.Callable[[typing.Any], typing.Any]] = list()
+
+    if (field_type := field_def.get('type', None)) in field_type_coercer:
+        checkers.append(field_type_coercer[field_type])
+
+    if (min_length := field_def.get('minLength', None)) is not None:
+        def check_min_length(value):
+            if len(value) < min_length:
+                raise RequestFieldSemanticException('TOO_SHORT')
+            return value
+        checkers.append(check_min_length)
+
+    if (max_length := field_def.get('maxLength', None)) is not None:
+        def check_max_length(value):
+            if len(value) > max_length:
+                raise RequestFieldSemanticException('TOO_LONG')
+            return value
+        checkers.append(check_max_length)
+
+    if (minimum := field_def.get('minimum', None)) is not None:
+        def check_minimum(value):
+            if value < minimum:
+                raise RequestFieldSemanticException('TOO_SMALL')
+            return value
+        checkers.append(check_minimum)
+
+    if (maximum := field_def.get('maximum', None)) is not None:
+        def check_maximum(value):
+            if value > maximum:
+                raise RequestFieldSemanticException('TOO_LARGE')
+            return value
+        checkers.append(check_maximum)
+
+    if (enum_values := field_def.get('enum', None)) is not None:
+        enum_set: frozenset = frozenset(enum_values)
+
+        def check_enum(value):
+            if value not in enum_set:
+                raise RequestFieldSemanticException('NOT_ALLOWED_VALUE')
+            return value
+        checkers.append(check_enum)
+
+    if not checkers:
+        return None
+    if len(checkers) == 1:
+        return checkers[0]
+
+    checkers: tuple[typing.Callable[[typing.Any], typing.Any]] = tuple(checkers)
+
+    def coercer(value):
+        for checker in checkers:
+            value = checker(value)
+        return value
+    return coercer
+
+
+@dataclasses.dataclass(frozen=True)
+class RequestFieldValidator:
+    '''
+    Field checker of request decorators, which is compiled once when decorator is applied.
+    This is shared between all requests(and threads), so this must not keep any per-request state.
+    '''
+    required_keys: tuple[str, ...]
+    allowed_keys: frozenset[str]
+    field_coercers: tuple[tuple[str, typing.Callable[[typing.Any], typing.Any]], ...]
+
+    @classmethod
+    def from_fields(cls,
+                    required_fields: dict[str, dict[str, str]],
+                    optional_fields: dict[str, dict[str, str]]) -> 'RequestFieldValidator':
+        field_coercers: list[tuple[str, typing.Callable[[typing.Any], typing.Any]]] = list()
+        for field_name, field_def in (*required_fields.items(), *optional_fields.items()):
+            if field_coercer := compile_field_coercer(field_def):
+                field_coercers.append((field_name, field_coercer))
+
+        return cls(
+            required_keys=tuple(required_fields),
+            allowed_keys=frozenset(required_fields) | frozenset(optional_fields),
+            field_coercers=tuple(field_coercers))
+
+    def pick_str_fields(self, source: typing.Mapping[str, str]) -> dict[str, str]:
+        # Only allowed fields are read and normalized, others are never touched.
+        # Empty values are treated as omitted.
+        result: dict[str, str] = dict()
+        for key in self.allowed_keys:
+            value = source.get(key, None)
+            if value and (value := normalize_str(value)):
+                result[key] = value
+        return result
+
+    def filter_fields(self, in_dict: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        return {k: v for k, v in in_dict.items() if k in self.allowed_keys}
+
+    def get_lacks(self, in_dict: dict[str, typing.Any]) -> list[str]:
+        return [k for k in self.required_keys if k not in in_dict]
+
+    def coerce_fields(self, in_dict: dict[str, typing.Any]) -> list[dict[str, str]]:
+        '''
+        Coerce field values of in_dict in place.
+        Returns list of {field name: reason} for fields that failed, same as the data of bad_semantics responses.
+        '''
+        bad_semantics: list[dict[str, str]] = list()
+        for field_name, field_coercer in self.field_coercers:
+            if field_name in in_dict:
+                try:
+                    in_dict[field_name] = field_coercer(in_dict[field_name])
+                except RequestFieldSemanticException as err:
+                    bad_semantics.append({field_name: err.reason})
+                except (TypeError, ValueError):
+                    # Checkers without type check(ex: maxLength on a number) can fail on unexpected value types.
+                    bad_semantics.append({field_name: 'NOT_A_VALID_VALUE'})
+        return bad_semantics
+
+
+# Query fields for paginating resource lists. Add these on optional_fields of RequestQuery.
+default_page_size: int = 100
+pagination_query_fields: dict[str, dict[str, typing.Any]] = {
+    'limit': {
+        'type': 'integer', 'minimum': 1, 'maximum': 500,
+        'description': f'Number of resources per page, {default_page_size} if not given.', },
+    'cursor': {
+        'type': 'integer',
+        'description': 'next_cursor of the previous page. First page will be returned if not given.', },
+    'fields': {
+        'type': 'string',
+        'description': 'Comma-separated names of fields to include. All fields will be included if not given.', },
+}
+
+
+def parse_fields_query(fields: typing.Optional[str]) -> typing.Optional[frozenset[str]]:
+    if not fields:
+        return None
+    return frozenset(field for field in (f.strip() for f in fields.split(',')) if field)
 
 
 class RequestHeader:
@@ -326,9 +622,8 @@ class RequestHeader:
                  required_fields: typing.Optional[dict[str, dict[str, str]]] = None,
                  optional_fields: typing.Optional[dict[str, dict[str, str]]] = None,
                  auth: typing.Optional[dict[AuthType, bool]] = None):
-        self.req_header: dict = dict()
-        self.required_fields: dict[str, dict[str, str]] = required_fields or {}
-        self.optional_fields: dict[str, dict[str, str]] = optional_fields or {}
+        self.required_fields: dict[str, dict[str, str]] = dict(required_fields or {})
+        self.optional_fields: dict[str, dict[str, str]] = dict(optional_fields or {})
         self.auth: dict[AuthType, bool] = auth or {}
 
         if AuthType.Bearer in self.auth:
@@ -340,26 +635,21 @@ class RequestHeader:
                 self.optional_fields['X-Csrf-Token'] = {'type': 'string', }
 
     def __call__(self, func: typing.Callable):
+        field_validator = RequestFieldValidator.from_fields(self.required_fields, self.optional_fields)
+        pass_req_header: bool = bool(self.required_fields or self.optional_fields)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             try:
-                # Filter for empty keys and values
-                self.req_header = json_dict_filter(flask.request.headers, True)
+                # Header names are case-insensitive, so fields are keyed with the names declared on decorator.
+                req_header = field_validator.pick_str_fields(flask.request.headers)
 
                 # Check if all required fields are in
-                if (not all([z in self.req_header.keys() for z in self.required_fields])):
-                    return CommonResponseCase.header_required_omitted.create_response(
-                        data={'lacks': [z for z in self.required_fields if z not in self.req_header], })
+                if lacks := field_validator.get_lacks(req_header):
+                    return CommonResponseCase.header_required_omitted.create_response(data={'lacks': lacks, })
 
-                # Remove every field not in required and optional fields
-                self.req_header = {k: self.req_header[k] for k in self.req_header
-                                   if k in list(self.required_fields.keys()) + list(self.optional_fields.keys())}
-                if self.required_fields and not self.req_header:
-                    return CommonResponseCase.header_required_omitted.create_response(
-                        data={'lacks': list(self.required_fields.keys()), })
-
-                if self.required_fields or self.optional_fields:
-                    kwargs['req_header'] = self.req_header
+                if pass_req_header:
+                    kwargs['req_header'] = req_header
             except Exception:
                 return CommonResponseCase.header_invalid.create_response()
 
@@ -371,7 +661,7 @@ class RequestHeader:
                 for auth, required in self.auth.items():
                     # We need match-case syntax which is introduced on Python 3.10
                     if auth == AuthType.Bearer:
-                        csrf_token = self.req_header.get('X-Csrf-Token', None)
+                        csrf_token = req_header.get('X-Csrf-Token', None)
                         if required and not csrf_token:
                             return account_resp_case.AccountResponseCase.access_token_invalid.create_response()
 
@@ -379,7 +669,8 @@ class RequestHeader:
                             access_token_bearer = flask.request.headers.get('Authorization', '').replace('Bearer ', '')
                             access_token = jwt_module.AccessToken.from_token(
                                 access_token_bearer,
-                                flask.current_app.config.get('SECRET_KEY')+csrf_token)
+                                flask.current_app.config.get('SECRET_KEY'),
+                                csrf_token=csrf_token)
                             kwargs['access_token'] = access_token
                         except jwt.exceptions.ExpiredSignatureError:
                             # AccessToken Expired error must be raised when bearer auth is softly required,
@@ -505,35 +796,28 @@ class RequestQuery:
     def __init__(self,
                  required_fields: typing.Optional[dict[str, dict[str, str]]] = None,
                  optional_fields: typing.Optional[dict[str, dict[str, str]]] = None):
-        self.req_query: dict = dict()
         self.required_fields: dict[str, dict[str, str]] = required_fields or {}
         self.optional_fields: dict[str, dict[str, str]] = optional_fields or {}
 
     def __call__(self, func: typing.Callable):
+        field_validator = RequestFieldValidator.from_fields(self.required_fields, self.optional_fields)
+        pass_req_query: bool = bool(self.required_fields or self.optional_fields)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             try:
-                # Filter for empty keys and values
-                self.req_query = json_dict_filter(flask.request.args.copy(), True)
+                req_query = field_validator.pick_str_fields(flask.request.args)
 
                 # Check if all required fields are in
-                if (not all([z in self.req_query.keys() for z in self.required_fields])):
-                    return CommonResponseCase.path_required_omitted.create_response(
-                        data={'lacks': [z for z in self.required_fields if z not in self.req_query], })
+                if lacks := field_validator.get_lacks(req_query):
+                    return CommonResponseCase.path_required_omitted.create_response(data={'lacks': lacks, })
 
-                # Remove every field not in required and optional fields
-                self.req_query = {k: self.req_query[k] for k in self.req_query
-                                  if k in list(self.required_fields.keys()) + list(self.optional_fields.keys())}
+                if bad_semantics := field_validator.coerce_fields(req_query):
+                    return CommonResponseCase.path_bad_semantics.create_response(
+                        data={'bad_semantics': bad_semantics, })
 
-                # Remove every field not in required and optional fields
-                self.req_query = {k: self.req_query[k] for k in self.req_query
-                                  if k in list(self.required_fields.keys()) + list(self.optional_fields.keys())}
-                if self.required_fields and not self.req_query:
-                    return CommonResponseCase.path_required_omitted.create_response(
-                        data={'lacks': list(self.required_fields.keys()), })
-
-                if self.required_fields or self.optional_fields:
-                    kwargs['req_query'] = self.req_query
+                if pass_req_query:
+                    kwargs['req_query'] = req_query
             except Exception:
                 return CommonResponseCase.body_invalid.create_response()
 
@@ -578,6 +862,11 @@ class RequestQuery:
                 if not doc_data['responses']:
                     doc_data['responses'] = list()
                 doc_data['responses'] += ['path_required_omitted', ]
+            if field_validator.field_coercers:
+                if not doc_data['responses']:
+                    doc_data['responses'] = list()
+                if 'path_bad_semantics' not in doc_data['responses']:
+                    doc_data['responses'].append('path_bad_semantics')
 
             func.__doc__ = yaml.safe_dump(doc_data)
             wrapper.__doc__ = yaml.safe_dump(doc_data)
@@ -589,35 +878,45 @@ class RequestBody:
     def __init__(self,
                  required_fields: typing.Optional[dict[str, dict[str, str]]] = None,
                  optional_fields: typing.Optional[dict[str, dict[str, str]]] = None):
-        self.req_body: dict = dict()
         self.required_fields: dict[str, dict[str, str]] = required_fields or {}
         self.optional_fields: dict[str, dict[str, str]] = optional_fields or {}
 
     def __call__(self, func: typing.Callable):
+        field_validator = RequestFieldValidator.from_fields(self.required_fields, self.optional_fields)
+        body_max_size: int = flask.current_app.config.get('REQUEST_BODY_MAX_SIZE', 1024 * 1024)
+        json_max_depth: int = flask.current_app.config.get('REQUEST_JSON_MAX_DEPTH', 16)
+        json_max_keys: int = flask.current_app.config.get('REQUEST_JSON_MAX_KEYS', 4096)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             try:
+                # Reject oversized body before decoding it, and never buffer more than the limit.
+                req_body = json_loads(read_request_body(body_max_size))
+                if type(req_body) is not dict:
+                    return CommonResponseCase.body_invalid.create_response()
+
                 # Filter for empty keys and values
-                self.req_body = json_dict_filter(flask.request.get_json(force=True), True)
+                json_normalize(req_body, json_max_depth, json_max_keys, True)
 
                 # Check if all required fields are in
-                if (not all([z in self.req_body.keys() for z in self.required_fields])):
-                    return CommonResponseCase.body_required_omitted.create_response(
-                        data={
-                            'lacks': [z for z in self.required_fields if z not in self.req_body]
-                        }
-                    )
+                if lacks := field_validator.get_lacks(req_body):
+                    return CommonResponseCase.body_required_omitted.create_response(data={'lacks': lacks, })
 
                 # Remove every field not in required and optional fields
-                self.req_body = {k: self.req_body[k] for k in self.req_body
-                                 if k in list(self.required_fields.keys()) + list(self.optional_fields.keys())}
-                if self.required_fields and not self.req_body:
+                req_body = field_validator.filter_fields(req_body)
+                if field_validator.required_keys and not req_body:
                     return CommonResponseCase.body_empty.create_response()
 
+                if bad_semantics := field_validator.coerce_fields(req_body):
+                    return CommonResponseCase.body_bad_semantics.create_response(
+                        data={'bad_semantics': bad_semantics, })
+
+            except RequestBodyLimitException:
+                return CommonResponseCase.body_too_large.create_response()
             except Exception:
                 return CommonResponseCase.body_invalid.create_response()
 
-            kwargs['req_body'] = self.req_body
+            kwargs['req_body'] = req_body
             return func(*args, **kwargs)
 
         # Parse docstring and inject requestBody data
@@ -656,7 +955,13 @@ class RequestBody:
                 doc_data['responses'] += [
                     'body_required_omitted',
                     'body_empty',
-                    'body_invalid']
+                    'body_invalid',
+                    'body_too_large']
+            if field_validator.field_coercers:
+                if not doc_data['responses']:
+                    doc_data['responses'] = list()
+                if 'body_bad_semantics' not in doc_data['responses']:
+                    doc_data['responses'].append('body_bad_semantics')
 
             func.__doc__ = yaml.safe_dump(doc_data)
             wrapper.__doc__ = yaml.safe_dump(doc_data)
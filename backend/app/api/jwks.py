@@ -0,0 +1,24 @@
+import flask
+import flask.views
+
+import app.api.helper_class as api_class
+import app.database.jwt as jwt_module
+
+from app.api.response_case import CommonResponseCase
+
+
+class JWKSRoute(flask.views.MethodView, api_class.MethodViewMixin):
+    def get(self):
+        '''
+        description: Public keys to verify tokens, as a JSON Web Key Set.
+            Available only when tokens are signed with asymmetric keys.
+        responses:
+            - http_not_found
+        '''
+        if not jwt_module.jwt_keyring:
+            return CommonResponseCase.http_not_found.create_response()
+
+        # JWKS must follow RFC 7517 format, so this can't be wrapped with our response format.
+        response = flask.jsonify(jwt_module.jwt_keyring.to_jwks())
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        return response
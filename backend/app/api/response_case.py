@@ -32,6 +32,10 @@ class CommonResponseCase(api_class.ResponseCaseCollector):
         description='This will be responsed when user-sent body data is empty or not parsable.',
         code=400, success=False,
         public_sub_code='request.body.empty')
+    body_too_large = api_class.Response(
+        description='This will be responsed when user-sent body is too large, or JSON is nested too deep.',
+        code=413, success=False,
+        public_sub_code='request.body.too_large')
     body_required_omitted = api_class.Response(
         description='This will be responsed when some requirements are not given in user-sent body data.',
         code=400, success=False,
@@ -61,6 +65,15 @@ class CommonResponseCase(api_class.ResponseCaseCollector):
         code=400, success=False,
         public_sub_code='request.path.omitted',
         data={'lacks': ['']})
+    path_bad_semantics = api_class.Response(
+        description='This will be responsed when validation of user-sent URL query is failed, '
+                    'such as not a valid boolean, etc.',
+        code=422, success=False,
+        public_sub_code='request.path.bad_semantics',
+        data={'bad_semantics': [{
+            'field': '',
+            'reason': ''
+        }, ]})
 
     http_ok = api_class.Response(
         description='Normal plane HTTP OK response',
@@ -126,6 +139,11 @@ class ResourceResponseCase(api_class.ResponseCaseCollector):
         code=201, success=True,
         public_sub_code='resource.created',
         data={}, )
+    resource_accepted = api_class.Response(  # Create, but processed asynchronously
+        description='Request accepted, and the resource will be processed on background',
+        code=202, success=True,
+        public_sub_code='resource.accepted',
+        data={}, )
     resource_modified = api_class.Response(  # Update
         description='Resource updated',
         code=201, success=True,
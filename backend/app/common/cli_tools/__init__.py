@@ -3,9 +3,19 @@ import flask
 import app.common.cli_tools.openapi_support as openapi_support
 import app.common.cli_tools.db_operation as db_operation
 import app.common.cli_tools.db_erd_draw as db_erd_draw
+import app.common.cli_tools.db_gc as db_gc
+import app.common.cli_tools.container_provision as container_provision
+import app.common.cli_tools.query_check as query_check
 
 
 def init_app(app: flask.Flask):
     app.cli.add_command(openapi_support.create_openapi_doc)
     app.cli.add_command(db_operation.drop_db)
+    app.cli.add_command(db_operation.migrate_db)
     app.cli.add_command(db_erd_draw.draw_db_erd)
+    app.cli.add_command(db_gc.gc_expired_tokens)
+    app.cli.add_command(container_provision.container_provision_worker)
+    app.cli.add_command(container_provision.fill_container_warm_pool)
+    app.cli.add_command(container_provision.reconcile_containers)
+    app.cli.add_command(query_check.check_query_count)
+    app.cli.add_command(query_check.check_query_plan)
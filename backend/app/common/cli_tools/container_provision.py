@@ -0,0 +1,54 @@
+import click
+import dataclasses
+import flask
+import flask.cli
+import typing
+
+import app.plugin.ddc_docker.provisioner as ddc_provisioner
+import app.plugin.ddc_docker.reconciler as ddc_reconciler
+import app.plugin.ddc_docker.warm_pool as ddc_warm_pool
+
+
+@click.command('container-provision-worker')
+@click.option('--workers', default=2, show_default=True, help='Number of worker threads.')
+@flask.cli.with_appcontext
+def container_provision_worker(workers: int):
+    worker_pool = ddc_provisioner.ProvisionWorkerPool(flask.current_app._get_current_object(), workers)
+    worker_pool.start()
+    print(f'Container provisioning worker started with {workers} threads')
+    try:
+        worker_pool.join()
+    except KeyboardInterrupt:
+        print('Stopping container provisioning worker...')
+        worker_pool.stop()
+
+
+@click.command('fill-container-warm-pool')
+@click.option('--size', default=None, type=int,
+              help='Warm pool size of each image. Defaults to CONTAINER_WARM_POOL_SIZE.')
+@flask.cli.with_appcontext
+def fill_container_warm_pool(size: typing.Optional[int]):
+    pool_size = size if size is not None else flask.current_app.config.get('CONTAINER_WARM_POOL_SIZE', 0)
+    created_count = ddc_warm_pool.replenish(pool_size)
+    print(f'Created {created_count} warm containers')
+
+
+@click.command('reconcile-containers')
+@click.option('--grace-period', default=None, type=int,
+              help='Skip containers created in this seconds. Defaults to CONTAINER_RECONCILE_GRACE_PERIOD.')
+@click.option('--dry-run', is_flag=True, default=False, help='Only count drifts.')
+@flask.cli.with_appcontext
+def reconcile_containers(grace_period: typing.Optional[int], dry_run: bool):
+    if grace_period is None:
+        grace_period = flask.current_app.config.get('CONTAINER_RECONCILE_GRACE_PERIOD', 300)
+
+    if dry_run:
+        result = ddc_reconciler.reconcile(grace_period, dry_run=True)
+    else:
+        result = ddc_reconciler.run_reconcile(grace_period, lock_timeout=600)
+        if result is None:
+            print('Other process is reconciling containers now')
+            return
+
+    for metric_name, metric_value in dataclasses.asdict(result).items():
+        print(f'{metric_name}: {metric_value}')
@@ -0,0 +1,78 @@
+import click
+import datetime
+import flask
+import flask.cli
+import time
+
+import app.common.utils as utils
+import app.database as db_module
+import app.database.jwt as jwt_module
+import app.database.user as user_module
+
+db = db_module.db
+
+
+def delete_expired_rows(table_name: str, pk_column, exp_column,
+                        batch_size: int, batch_sleep: float, max_batches: int, dry_run: bool) -> int:
+    current_time = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
+
+    if dry_run:
+        expired_count = db.session.query(db.func.count(pk_column)).filter(exp_column < current_time).scalar()
+        print(f'[{table_name}] {expired_count} expired rows found, '
+              f'{(expired_count + batch_size - 1) // batch_size} batches would be deleted (dry run)')
+        return expired_count
+
+    deleted_count = 0
+    batch_num = 0
+    start_time = time.monotonic()
+    while not max_batches or batch_num < max_batches:
+        # Delete in bounded batches, so that each transaction doesn't hold locks for long time.
+        pk_batch = [row[0] for row in db.session.query(pk_column)
+                                                .filter(exp_column < current_time)
+                                                .order_by(pk_column)
+                                                .limit(batch_size).all()]
+        if not pk_batch:
+            break
+
+        try:
+            batch_deleted_count = db.session.query(pk_column.class_)\
+                .filter(pk_column.in_(pk_batch))\
+                .delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        batch_num += 1
+        deleted_count += batch_deleted_count
+        elapsed_time = time.monotonic() - start_time
+        print(f'[{table_name}] batch {batch_num}: deleted {batch_deleted_count} rows '
+              f'(total {deleted_count} rows, {deleted_count / elapsed_time if elapsed_time else 0:.1f} rows/s)')
+
+        if len(pk_batch) < batch_size:
+            break
+        if batch_sleep:
+            time.sleep(batch_sleep)
+
+    print(f'[{table_name}] deleted {deleted_count} expired rows in {batch_num} batches')
+    return deleted_count
+
+
+@click.command('gc-expired-tokens')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows to delete in a transaction.')
+@click.option('--batch-sleep', default=0.5, show_default=True, help='Seconds to sleep between batches.')
+@click.option('--max-batches', default=0, show_default=True,
+              help='Stop after this many batches per table. 0 means no limit.')
+@click.option('--dry-run', is_flag=True, default=False, help='Only count expired rows.')
+@flask.cli.with_appcontext
+def gc_expired_tokens(batch_size: int, batch_sleep: float, max_batches: int, dry_run: bool):
+    try:
+        delete_expired_rows(
+            'TB_REFRESH_TOKEN', jwt_module.RefreshToken.jti, jwt_module.RefreshToken.exp,
+            batch_size, batch_sleep, max_batches, dry_run)
+        delete_expired_rows(
+            'TB_EMAILTOKEN', user_module.EmailToken.uuid, user_module.EmailToken.expired_at,
+            batch_size, batch_sleep, max_batches, dry_run)
+    except Exception as err:
+        print('Error raised while deleting expired tokens')
+        print(utils.get_traceback_msg(err))
@@ -1,9 +1,14 @@
 import click
 import flask
 import flask.cli
+import sqlalchemy as sql
+import sqlalchemy.schema as sqlschema
 
+import app.common.utils as utils
 import app.database
 
+db = app.database.db
+
 
 @click.command('drop-db')
 @flask.cli.with_appcontext
@@ -17,3 +22,67 @@ def drop_db():
         print('Successfully dropped DB')
     except Exception:
         print('Error raised while dropping DB')
+
+
+def get_migration_statements() -> list[str]:
+    '''
+    Compare models with the connected DB, and returns DDL statements that adds missing columns and indexes.
+    Tables are created with checkfirst on app load, so already existing tables never get new columns and indexes.
+    Only additive changes are handled here, column type changes and drops must be done manually.
+    '''
+    inspector = sql.inspect(db.engine)
+    dialect = db.engine.dialect
+    existing_tables = set(inspector.get_table_names())
+
+    statements: list[str] = list()
+    for table in db.get_tables_for_bind():
+        if table.name not in existing_tables:
+            # New tables will be created with all indexes on app load.
+            continue
+
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable:
+                # Existing rows cannot be filled, so this must be done manually with a proper backfill.
+                print(f'[{table.name}] Cannot add NOT NULL column {column.name} automatically, '
+                      'add this column manually')
+                continue
+
+            column_type = column.type.compile(dialect=dialect)
+            statements.append(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            statements.append(str(sqlschema.CreateIndex(index).compile(dialect=dialect)))
+
+    return statements
+
+
+@click.command('migrate-db')
+@click.option('--dry-run', is_flag=True, default=False, help='Only print DDL statements.')
+@flask.cli.with_appcontext
+def migrate_db(dry_run: bool):
+    try:
+        statements = get_migration_statements()
+        if not statements:
+            print('DB is already up to date')
+            return
+
+        for statement in statements:
+            print(statement.strip() + ';')
+        if dry_run:
+            print(f'{len(statements)} statements would be executed (dry run)')
+            return
+
+        # PostgreSQL and SQLite supports transactional DDL, so all statements are applied or nothing.
+        with db.engine.begin() as connection:
+            for statement in statements:
+                connection.execute(sql.text(statement))
+        print(f'Successfully executed {len(statements)} statements')
+    except Exception as err:
+        print('Error raised while migrating DB')
+        print(utils.get_traceback_msg(err))
@@ -0,0 +1,298 @@
+import click
+import contextlib
+import dataclasses
+import datetime
+import flask
+import flask.cli
+import re
+import secrets
+import sqlalchemy as sql
+import sqlalchemy.event as sqlevent
+import sqlalchemy.orm as sqlorm
+import sys
+import typing
+
+import app.database as db_module
+import app.database.dodoco.container as ddc_db_container
+import app.database.dodoco.project as ddc_db_project
+import app.database.jwt as jwt_module
+import app.database.user as user_module
+
+db = db_module.db
+redis_db = db_module.redis_db
+RedisKeyType = db_module.RedisKeyType
+
+check_user_agent: str = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '\
+                        'Chrome/90.0 Safari/537.36'
+
+
+class StatementCounter:
+    '''Records SQL statements executed on the engine while this is entered.'''
+    def __init__(self):
+        self.statements: list[str] = list()
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self) -> 'StatementCounter':
+        sqlevent.listen(db.engine, 'before_cursor_execute', self.on_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sqlevent.remove(db.engine, 'before_cursor_execute', self.on_execute)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+@contextlib.contextmanager
+def rollback_session():
+    '''
+    Rows created in this block are never committed to DB.
+    Commits are turned into flushes while this is entered, and everything is rolled back on exit.
+    '''
+    session = db.session()
+    session.commit = session.flush
+    try:
+        yield session
+    finally:
+        del session.commit
+        session.rollback()
+
+
+def create_check_user() -> user_module.User:
+    check_user_id = f'query_check_{secrets.token_hex(8)}'
+    check_user = user_module.User(
+        id=check_user_id,
+        nickname=check_user_id,
+        password='-',  # Never matches any password hash, so this user cannot sign in.
+        email=f'{check_user_id}@query-check.invalid',
+        last_login_date=datetime.datetime.utcnow())
+    db.session.add(check_user)
+    db.session.flush()
+    return check_user
+
+
+def create_check_projects(check_user: user_module.User, project_count: int) -> list[ddc_db_project.Project]:
+    '''Create projects that check_user is a member of, each with a container that exposes a port.'''
+    check_tag = ddc_db_project.ProjectTag(name='Query check', code=f'query_check_{secrets.token_hex(8)}')
+    db.session.add(check_tag)
+
+    check_projects: list[ddc_db_project.Project] = list()
+    for project_num in range(project_count):
+        check_project = ddc_db_project.Project(
+            name=f'Query check {project_num}', tag=check_tag, created_by_id=check_user.uuid)
+        check_container = ddc_db_container.Container(
+            name=f'Query check {project_num}', project=check_project, created_by_id=check_user.uuid,
+            container_name=f'query_check_{secrets.token_hex(8)}')
+        db.session.add_all((
+            check_project,
+            ddc_db_project.ProjectMember(project=check_project, user_id=check_user.uuid, leader=True, accepted=True),
+            check_container,
+            ddc_db_container.ContainerPort(container=check_container, container_port=22, exposed_port=22), ))
+        check_projects.append(check_project)
+
+    db.session.flush()
+    return check_projects
+
+
+@dataclasses.dataclass
+class QueryCountCheck:
+    name: str
+    # Receives number of rows to create, runs the path under StatementCounter, and returns the counter.
+    func: typing.Callable[[int], StatementCounter]
+    # Statement count must not exceed this, if given.
+    max_statements: typing.Optional[int] = None
+
+
+query_count_checks: dict[str, QueryCountCheck] = dict()
+
+
+def query_count_check(name: str, max_statements: typing.Optional[int] = None):
+    def decorator(func: typing.Callable[[int], StatementCounter]):
+        query_count_checks[name] = QueryCountCheck(name, func, max_statements)
+        return func
+    return decorator
+
+
+# Refresh token and its user are loaded in one query, or restored from validation cache without DB query.
+@query_count_check('refresh', max_statements=0 if jwt_module.refresh_token_cache_enable else 1)
+def check_refresh(row_count: int) -> StatementCounter:
+    # Same calls with AccessTokenIssueRoute, on a refresh that doesn't rotate refresh token.
+    secret_key = flask.current_app.config.get('SECRET_KEY')
+    check_user = create_check_user()
+
+    refresh_token_jwts: list[str] = list()
+    refresh_token_jtis: list[int] = list()
+    for _ in range(row_count):
+        refresh_token = jwt_module.RefreshToken.from_usertable(check_user)
+        refresh_token.user_agent = check_user_agent
+        refresh_token.user_agent_fingerprint = jwt_module.user_agent_fingerprint(check_user_agent)
+        refresh_token.ip_addr = '127.0.0.1'
+        refresh_token_jwts.append(refresh_token.create_token(secret_key))
+        refresh_token_jtis.append(refresh_token.jti)
+
+    try:
+        # Request starts with an empty identity map.
+        db.session.expunge_all()
+        with StatementCounter() as counter:
+            refresh_token = jwt_module.RefreshToken.from_token(refresh_token_jwts[-1], secret_key)
+            refresh_token.get_user_snapshot().to_dict()
+            jwt_module.refresh_login_data(
+                refresh_token, check_user_agent, secrets.token_hex(16), None, '127.0.0.1', secret_key)
+        return counter
+    finally:
+        # Rows are rolled back, so Redis entries of those must be removed too.
+        redis_db.delete(*[RedisKeyType.REFRESH_TOKEN_CACHE.as_redis_key(jti) for jti in refresh_token_jtis])
+
+
+@query_count_check('project_list')
+def check_project_list(row_count: int) -> StatementCounter:
+    # Same calls with ProjectMainRoute.get, without fields query.
+    check_user = create_check_user()
+    create_check_projects(check_user, row_count)
+
+    db.session.expunge_all()
+    with StatementCounter() as counter:
+        project_query = ddc_db_project.Project.query_builder(
+            user_id=check_user.uuid, limit=row_count, to_dict_kwargs={'fields': None, })
+        for check_project in project_query.all():
+            check_project.to_dict(fields=None)
+    return counter
+
+
+@query_count_check('container_list')
+def check_container_list(row_count: int) -> StatementCounter:
+    # Same calls with ContainerMainRoute.get, without fields query.
+    check_user = create_check_user()
+    create_check_projects(check_user, row_count)
+
+    db.session.expunge_all()
+    with StatementCounter() as counter:
+        project_uuid_query = ddc_db_project.Project.query_builder(user_id=check_user.uuid, uuid_only=True).subquery()
+        container_query = db.session.query(ddc_db_container.Container)\
+            .filter(ddc_db_container.Container.project_id.in_(project_uuid_query))\
+            .options(*ddc_db_container.Container.to_dict_load_options(fields=None))
+        container_query = db_module.keyset_paginate(container_query, ddc_db_container.Container.uuid, None, row_count)
+        for check_container in container_query.all():
+            check_container.to_dict(fields=None)
+    return counter
+
+
+@click.command('check-query-count')
+@click.option('--small', default=5, show_default=True, help='Number of rows on the first run.')
+@click.option('--large', default=50, show_default=True, help='Number of rows on the second run.')
+@click.argument('check_names', nargs=-1)
+@flask.cli.with_appcontext
+def check_query_count(small: int, large: int, check_names: tuple[str, ...]):
+    '''
+    Run each check with small and large number of rows on a rolled back session,
+    and fail if statement count grows with rows or exceeds the limit of the check.
+    '''
+    failed_checks: list[str] = list()
+    for check_name in check_names or query_count_checks.keys():
+        check = query_count_checks[check_name]
+        statement_counts: list[int] = list()
+        for row_count in (small, large):
+            with rollback_session():
+                statement_counts.append(len(check.func(row_count)))
+
+        check_failed = statement_counts[0] != statement_counts[1]
+        if check.max_statements is not None:
+            check_failed = check_failed or max(statement_counts) > check.max_statements
+        if check_failed:
+            failed_checks.append(check_name)
+
+        print(f'[{"FAIL" if check_failed else "OK"}] {check_name}: '
+              f'{statement_counts[0]} statements with {small} rows, {statement_counts[1]} with {large} rows'
+              + (f' (max {check.max_statements})' if check.max_statements is not None else ''))
+
+    if failed_checks:
+        print(f'{len(failed_checks)} checks failed: {", ".join(failed_checks)}')
+        sys.exit(1)
+
+
+@dataclasses.dataclass
+class QueryPlanCheck:
+    name: str
+    query_factory: typing.Callable[[], sqlorm.Query]
+    # Plan must use at least one of these indexes.
+    expected_indexes: tuple[str, ...]
+    # Plan must not scan these tables fully.
+    unscanned_tables: tuple[str, ...]
+
+
+query_plan_checks: list[QueryPlanCheck] = [
+    QueryPlanCheck(
+        name='project_membership',
+        query_factory=lambda: ddc_db_project.Project.query_builder(user_id=0),
+        expected_indexes=('IX_ProjectMember_UserID_ProjectID', 'IX_ProjectMember_ProjectID_UserID', ),
+        unscanned_tables=('TB_PROJECT_MEMBER', ), ),
+    QueryPlanCheck(
+        name='project_tag',
+        query_factory=lambda: ddc_db_project.Project.query_builder(user_id=0, tag=['query_check', ], limit=100),
+        expected_indexes=('IX_ProjectMember_UserID_ProjectID', 'IX_ProjectMember_ProjectID_UserID', ),
+        unscanned_tables=('TB_PROJECT_MEMBER', 'TB_PROJECT_TAG', ), ),
+    QueryPlanCheck(
+        name='container_list',
+        query_factory=lambda: db.session.query(ddc_db_container.Container).filter(
+            ddc_db_container.Container.project_id.in_(
+                ddc_db_project.Project.query_builder(user_id=0, uuid_only=True).subquery())),
+        expected_indexes=('IX_Container_ProjectID_UUID', ),
+        unscanned_tables=('TB_CONTAINER', 'TB_PROJECT_MEMBER', ), ),
+]
+
+
+def explain_query(target_query: sqlorm.Query) -> list[str]:
+    dialect_name: str = db.engine.dialect.name
+    compiled_query = str(target_query.statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect_name == 'sqlite':
+        return [row[-1] for row in db.session.execute(sql.text(f'EXPLAIN QUERY PLAN {compiled_query}'))]
+    elif dialect_name == 'postgresql':
+        # Tables on a fresh DB are too small for the planner to prefer indexes,
+        # so this checks whether the indexes can serve the query at all.
+        db.session.execute(sql.text('SET LOCAL enable_seqscan = off'))
+        return [row[0] for row in db.session.execute(sql.text(f'EXPLAIN {compiled_query}'))]
+    raise click.ClickException(f'Query plan check is not supported on {dialect_name}')
+
+
+def is_full_scan(plan_line: str, table_name: str) -> bool:
+    if db.engine.dialect.name == 'sqlite':
+        return bool(re.search(rf'\bSCAN "?{table_name}"?(\s|$)', plan_line))
+    return f'Seq Scan on "{table_name}"' in plan_line or f'Seq Scan on {table_name} ' in plan_line
+
+
+@click.command('check-query-plan')
+@flask.cli.with_appcontext
+def check_query_plan():
+    '''
+    EXPLAIN project and container list queries,
+    and fail if those don't use the indexes for membership and container lookups, or scan those tables fully.
+    '''
+    failed_checks: list[str] = list()
+    try:
+        for check in query_plan_checks:
+            query_plan = explain_query(check.query_factory())
+
+            check_errors: list[str] = list()
+            if not any(index_name in plan_line for plan_line in query_plan for index_name in check.expected_indexes):
+                check_errors.append(f'none of {", ".join(check.expected_indexes)} is used')
+            for table_name in check.unscanned_tables:
+                if any(is_full_scan(plan_line, table_name) for plan_line in query_plan):
+                    check_errors.append(f'{table_name} is scanned fully')
+
+            if check_errors:
+                failed_checks.append(check.name)
+                print(f'[FAIL] {check.name}: {"; ".join(check_errors)}')
+                for plan_line in query_plan:
+                    print(f'    {plan_line}')
+            else:
+                print(f'[OK] {check.name}')
+    finally:
+        db.session.rollback()
+
+    if failed_checks:
+        print(f'{len(failed_checks)} checks failed: {", ".join(failed_checks)}')
+        sys.exit(1)
@@ -0,0 +1,165 @@
+import base64
+import cryptography.hazmat.primitives.asymmetric.ec as crypto_ec
+import cryptography.hazmat.primitives.asymmetric.ed25519 as crypto_ed25519
+import cryptography.hazmat.primitives.serialization as crypto_serialization
+import dataclasses
+import datetime
+import json
+import os
+import pathlib as pt
+import threading
+import time
+import typing
+
+import app.common.utils as utils
+
+# Key ring file is a JSON file like below.
+# Private key paths are relative to the key ring file.
+# {
+#     "keys": [
+#         {"kid": "2021-09", "private_key": "2021-09.pem",
+#          "not_before": "2021-09-01T00:00:00", "not_after": "2022-01-01T00:00:00"},
+#         {"kid": "2021-11", "private_key": "2021-11.pem",
+#          "not_before": "2021-11-01T00:00:00"}
+#     ]
+# }
+# A key is published on JWKS from the moment it's added until its not_after,
+# but it's used to sign tokens only after its not_before.
+# Newest activated key signs all tokens, so to rotate keys,
+# add a new key with future not_before, and set not_after of the old key
+# to at least (not_before of the new key + the longest token lifetime).
+asymmetric_algorithms: tuple[str] = ('ES256', 'EdDSA')
+
+
+def b64url_uint(value: int, length: int) -> str:
+    return base64.urlsafe_b64encode(value.to_bytes(length, 'big')).rstrip(b'=').decode()
+
+
+def parse_keyring_datetime(value: typing.Optional[str]) -> typing.Optional[datetime.datetime]:
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value).replace(tzinfo=utils.UTC)
+
+
+@dataclasses.dataclass
+class JWTKey:
+    kid: str
+    algorithm: str
+    private_key: typing.Any
+    not_before: typing.Optional[datetime.datetime] = None
+    not_after: typing.Optional[datetime.datetime] = None
+
+    @property
+    def public_key(self) -> typing.Any:
+        return self.private_key.public_key()
+
+    def is_signable(self, current_time: datetime.datetime) -> bool:
+        return (self.not_before is None or self.not_before <= current_time) and self.is_verifiable(current_time)
+
+    def is_verifiable(self, current_time: datetime.datetime) -> bool:
+        return self.not_after is None or current_time < self.not_after
+
+    def to_jwk(self) -> dict:
+        result = {'kid': self.kid, 'alg': self.algorithm, 'use': 'sig', }
+        if self.algorithm == 'ES256':
+            public_numbers = self.public_key.public_numbers()
+            result.update({
+                'kty': 'EC', 'crv': 'P-256',
+                'x': b64url_uint(public_numbers.x, 32),
+                'y': b64url_uint(public_numbers.y, 32),
+            })
+        else:
+            public_bytes = self.public_key.public_bytes(
+                encoding=crypto_serialization.Encoding.Raw,
+                format=crypto_serialization.PublicFormat.Raw)
+            result.update({
+                'kty': 'OKP', 'crv': 'Ed25519',
+                'x': base64.urlsafe_b64encode(public_bytes).rstrip(b'=').decode(),
+            })
+        return result
+
+
+class JWTKeyRing:
+    def __init__(self, keyring_path: pt.Path, algorithm: str, reload_interval: float = 60.0):
+        if algorithm not in asymmetric_algorithms:
+            raise ValueError(f'Key ring supports only <{", ".join(asymmetric_algorithms)}>, not {algorithm}')
+
+        self.keyring_path: pt.Path = pt.Path(keyring_path)
+        self.algorithm: str = algorithm
+        self.reload_interval: float = reload_interval
+
+        self.keys: dict[str, JWTKey] = dict()
+        self._keyring_mtime: float = -1.0
+        self._checked_at: float = 0.0
+        self._lock: threading.Lock = threading.Lock()
+
+        self.reload()
+
+    def load_private_key(self, key_path: pt.Path) -> typing.Any:
+        private_key = crypto_serialization.load_pem_private_key(key_path.read_bytes(), password=None)
+        if self.algorithm == 'ES256':
+            if not isinstance(private_key, crypto_ec.EllipticCurvePrivateKey)\
+                    or not isinstance(private_key.curve, crypto_ec.SECP256R1):
+                raise ValueError(f'{key_path} is not a P-256 EC private key')
+        elif not isinstance(private_key, crypto_ed25519.Ed25519PrivateKey):
+            raise ValueError(f'{key_path} is not an Ed25519 private key')
+        return private_key
+
+    def reload(self):
+        keyring_mtime = os.stat(self.keyring_path).st_mtime
+        if keyring_mtime == self._keyring_mtime:
+            return
+
+        keyring_data: dict = json.loads(self.keyring_path.read_text(encoding='utf-8'))
+        new_keys: dict[str, JWTKey] = dict()
+        for key_data in keyring_data.get('keys', []):
+            new_keys[key_data['kid']] = JWTKey(
+                kid=key_data['kid'],
+                algorithm=self.algorithm,
+                private_key=self.load_private_key(self.keyring_path.parent / key_data['private_key']),
+                not_before=parse_keyring_datetime(key_data.get('not_before', None)),
+                not_after=parse_keyring_datetime(key_data.get('not_after', None)))
+
+        if not new_keys:
+            raise ValueError(f'No keys found on key ring {self.keyring_path}')
+
+        self.keys = new_keys
+        self._keyring_mtime = keyring_mtime
+
+    def reload_if_needed(self):
+        if time.monotonic() - self._checked_at < self.reload_interval:
+            return
+
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.reload_interval:
+                return
+            try:
+                self.reload()
+            except Exception as err:
+                # Keep using the old keys if the key ring is broken while rotating.
+                print(utils.get_traceback_msg(err))
+            self._checked_at = time.monotonic()
+
+    def get_signing_key(self) -> JWTKey:
+        self.reload_if_needed()
+        current_time = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
+        min_datetime = datetime.datetime.min.replace(tzinfo=utils.UTC)
+
+        signable_keys = [key for key in self.keys.values() if key.is_signable(current_time)]
+        if not signable_keys:
+            raise ValueError('No signable key on key ring')
+        return max(signable_keys, key=lambda key: key.not_before or min_datetime)
+
+    def get_verify_key(self, kid: typing.Optional[str]) -> JWTKey:
+        self.reload_if_needed()
+        current_time = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
+
+        target_key = self.keys.get(kid, None)
+        if not target_key or not target_key.is_verifiable(current_time):
+            raise KeyError(f'Key {kid} not found on key ring or retired')
+        return target_key
+
+    def to_jwks(self) -> dict:
+        self.reload_if_needed()
+        current_time = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
+        return {'keys': [key.to_jwk() for key in self.keys.values() if key.is_verifiable(current_time)], }
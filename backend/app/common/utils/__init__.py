@@ -1,4 +1,5 @@
 # -*- coding: UTF-8 -*-
+import collections
 import datetime
 import email
 import enum
@@ -11,6 +12,7 @@ import socket
 import string
 import sqlalchemy as sql
 import sqlalchemy.ext.declarative as sqldec
+import threading
 import time
 import traceback
 import typing
@@ -324,6 +326,83 @@ class Struct:
         self.__dict__.update(entries)
 
 
+class TTLCache:
+    '''
+    Bounded LRU cache which every entry expires on its own deadline(unix time).
+    Entries are guarded with a lock, so this can be shared between threads of a worker.
+    '''
+    def __init__(self, max_size: int = 1024):
+        self.max_size: int = max_size
+        self._data: collections.OrderedDict[typing.Hashable, tuple[float, typing.Any]] = collections.OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                return default
+
+            if item[0] <= time.time():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key: typing.Hashable, value: typing.Any, expires_at: float):
+        if self.max_size <= 0 or expires_at <= time.time():
+            return
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class BloomFilter:
+    '''
+    Fixed-size bloom filter.
+    Membership test may return false positive, but never returns false negative.
+    '''
+    def __init__(self, capacity: int = 65536, error_rate: float = 0.01):
+        self.capacity: int = capacity
+        self.bit_size: int = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count: int = max(1, round(self.bit_size / capacity * math.log(2)))
+        self.count: int = 0
+        self._bits: bytearray = bytearray((self.bit_size + 7) // 8)
+
+    def _bit_positions(self, item: typing.Any) -> typing.Iterator[int]:
+        # Kirsch-Mitzenmacher double hashing, derive all positions from one digest
+        digest = hashlib.blake2b(str(item).encode(), digest_size=16).digest()
+        hash_1 = int.from_bytes(digest[:8], 'little')
+        hash_2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((hash_1 + i * hash_2) % self.bit_size for i in range(self.hash_count))
+
+    def __contains__(self, item: typing.Any) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._bit_positions(item))
+
+    def add(self, item: typing.Any):
+        for pos in self._bit_positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
 class EnumAutoName(enum.Enum):
     def _generate_next_value_(name, start, count, last_values):
         return name
@@ -394,19 +473,19 @@ def create_dynamic_orm_table(
 
 # ---------- Extra tools ----------
 def find_free_random_port(port: int = 24000, max_port: int = 34000) -> int:
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tried_ports = list()
-    while True:
-        if len(range(port, max_port)) == len(tried_ports):
-            raise IOError('no free ports')
-
-        port = random.randint(port, max_port)
-        if port in tried_ports:
+    tried_ports: set[int] = set()
+    while len(tried_ports) < len(range(port, max_port + 1)):
+        target_port = random.randint(port, max_port)
+        if target_port in tried_ports:
             continue
+        tried_ports.add(target_port)
 
-        try:
-            sock.bind(('', port))
-            sock.close()
-            return port
-        except OSError:
-            continue
+        # A socket that failed to bind cannot be reused, so create a new one on every try.
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(('', target_port))
+                return target_port
+            except OSError:
+                continue
+
+    raise IOError('no free ports')
@@ -18,6 +18,11 @@ class Config:
     # This will be enabled only if $env:REFERER_CHECK is 'false'
     REFERER_CHECK = os.environ.get('REFERER_CHECK', True) != 'false'
     SECRET_KEY = os.environ.get('SECRET_KEY', secrets.token_hex(32))
+    # JWT_ALGORITHM can be HS256, ES256 or EdDSA.
+    # HS256 signs tokens with SECRET_KEY, and others sign tokens with private keys on JWT_KEYRING_PATH.
+    # Public keys of the key ring are served on /.well-known/jwks.json
+    JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+    JWT_KEYRING_PATH = os.environ.get('JWT_KEYRING_PATH', None)
     DEVELOPMENT_KEY = os.environ.get('DEVELOPMENT_KEY')
     LOCAL_DEV_CLIENT_PORT = None
 
@@ -26,6 +31,50 @@ class Config:
     ACCOUNT_ROUTE_ENABLE = os.environ.get('ACCOUNT_ROUTE_ENABLE', True) != 'false'
     DROP_ALL_REFRESH_TOKEN_ON_LOAD = os.environ.get('DROP_ALL_REFRESH_TOKEN_ON_LOAD', True) != 'false'
 
+    # Verified access tokens are cached on each worker.
+    # A cached token is fully re-verified after ACCESS_TOKEN_CACHE_TTL seconds.
+    # Set ACCESS_TOKEN_CACHE_SIZE to 0 to disable the cache.
+    ACCESS_TOKEN_CACHE_SIZE = int(os.environ.get('ACCESS_TOKEN_CACHE_SIZE', 4096))
+    ACCESS_TOKEN_CACHE_TTL = int(os.environ.get('ACCESS_TOKEN_CACHE_TTL', 10))
+    # Each worker mirrors revoked token JTIs from Redis on every TOKEN_REVOKE_INDEX_SYNC_INTERVAL seconds,
+    # so Redis is asked about revocation only when the local index hits.
+    TOKEN_REVOKE_INDEX_SYNC_INTERVAL = float(os.environ.get('TOKEN_REVOKE_INDEX_SYNC_INTERVAL', 1.0))
+    TOKEN_REVOKE_INDEX_CAPACITY = int(os.environ.get('TOKEN_REVOKE_INDEX_CAPACITY', 65536))
+    # Refresh tokens are validated with the data cached on Redis when they're issued,
+    # and DB is used only on cache miss or when the token needs to be modified.
+    # This will be enabled only if $env:REFRESH_TOKEN_CACHE_ENABLE is 'true'
+    REFRESH_TOKEN_CACHE_ENABLE = os.environ.get('REFRESH_TOKEN_CACHE_ENABLE', False) == 'true'
+
+    # Limits of JSON request body. Body size is checked before decoding it.
+    REQUEST_BODY_MAX_SIZE = int(os.environ.get('REQUEST_BODY_MAX_SIZE', 1024 * 1024))
+    REQUEST_JSON_MAX_DEPTH = int(os.environ.get('REQUEST_JSON_MAX_DEPTH', 16))
+    REQUEST_JSON_MAX_KEYS = int(os.environ.get('REQUEST_JSON_MAX_KEYS', 4096))
+
+    # Containers are provisioned on background threads of each API server process.
+    # Set this to 0 and run `flask container-provision-worker` to provision on a separate process.
+    CONTAINER_PROVISION_WORKERS = int(os.environ.get('CONTAINER_PROVISION_WORKERS', 2))
+    # Containers of frozen or deleted projects are removed concurrently by the provisioning workers.
+    # Each container is killed if it doesn't stop in CONTAINER_TEARDOWN_TIMEOUT seconds.
+    CONTAINER_TEARDOWN_CONCURRENCY = int(os.environ.get('CONTAINER_TEARDOWN_CONCURRENCY', 8))
+    CONTAINER_TEARDOWN_TIMEOUT = int(os.environ.get('CONTAINER_TEARDOWN_TIMEOUT', 10))
+    # Number of stopped containers to keep ready for each whitelisted image. Set this to 0 to disable warm pool.
+    # Warm pools are checked on every CONTAINER_WARM_POOL_INTERVAL seconds, and right after a container is claimed.
+    CONTAINER_WARM_POOL_SIZE = int(os.environ.get('CONTAINER_WARM_POOL_SIZE', 0))
+    CONTAINER_WARM_POOL_INTERVAL = float(os.environ.get('CONTAINER_WARM_POOL_INTERVAL', 30.0))
+    # Exposed ports of containers are allocated in [CONTAINER_PORT_RANGE_START, CONTAINER_PORT_RANGE_END).
+    CONTAINER_PORT_RANGE_START = int(os.environ.get('CONTAINER_PORT_RANGE_START', 24000))
+    CONTAINER_PORT_RANGE_END = int(os.environ.get('CONTAINER_PORT_RANGE_END', 34000))
+    # Container records are reconciled with Docker containers on every CONTAINER_RECONCILE_INTERVAL seconds.
+    # Set this to 0 to disable, and run `flask reconcile-containers` manually.
+    # Containers created in CONTAINER_RECONCILE_GRACE_PERIOD seconds are not touched.
+    CONTAINER_RECONCILE_INTERVAL = float(os.environ.get('CONTAINER_RECONCILE_INTERVAL', 60.0))
+    CONTAINER_RECONCILE_GRACE_PERIOD = int(os.environ.get('CONTAINER_RECONCILE_GRACE_PERIOD', 300))
+    # Container status column is updated from Docker events, and those are written on DB in batches
+    # on every CONTAINER_STATUS_FLUSH_INTERVAL seconds.
+    # `CONTAINER_STATUS_WATCH_ENABLE` will be disabled only if $env:CONTAINER_STATUS_WATCH_ENABLE is 'false'
+    CONTAINER_STATUS_WATCH_ENABLE = os.environ.get('CONTAINER_STATUS_WATCH_ENABLE', True) != 'false'
+    CONTAINER_STATUS_FLUSH_INTERVAL = float(os.environ.get('CONTAINER_STATUS_FLUSH_INTERVAL', 1.0))
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DB_URL')
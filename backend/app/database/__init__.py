@@ -6,6 +6,7 @@ import secrets
 import sqlalchemy.dialects.mysql as sqldlc_mysql
 import sqlalchemy.dialects.postgresql as sqldlc_psql
 import sqlalchemy.dialects.sqlite as sqldlc_sqlite
+import sqlalchemy.orm as sqlorm
 import typing
 
 import app.common.utils as utils
@@ -23,6 +24,42 @@ class RedisKeyType(utils.EnumAutoName):
     EMAIL_VERIFICATION = enum.auto()
     EMAIL_PASSWORD_RESET = enum.auto()
     TOKEN_REVOKE = enum.auto()
+    # Sorted set of revoked JTIs scored by TOKEN_REVOKE_VERSION, and its counter.
+    # Use these enum values as Redis key directly.
+    TOKEN_REVOKE_INDEX = enum.auto()
+    TOKEN_REVOKE_VERSION = enum.auto()
+    # Validation data of refresh token, see RefreshToken.set_validation_cache().
+    REFRESH_TOKEN_CACHE = enum.auto()
+    # Container provisioning job hash, and the queue of job ids.
+    # Use CONTAINER_PROVISION_QUEUE's enum value as Redis key directly.
+    CONTAINER_PROVISION_JOB = enum.auto()
+    CONTAINER_PROVISION_QUEUE = enum.auto()
+    # Provisioning job id of each container record.
+    CONTAINER_PROVISION_CONTAINER_JOB = enum.auto()
+    # Hash of provisioning worker pool ids and its worker count, heartbeat of each pool,
+    # and the list of jobs being processed by each worker.
+    # Use CONTAINER_PROVISION_WORKER_POOL's enum value as Redis key directly.
+    CONTAINER_PROVISION_WORKER_POOL = enum.auto()
+    CONTAINER_PROVISION_HEARTBEAT = enum.auto()
+    CONTAINER_PROVISION_PROCESSING = enum.auto()
+    # Queue of Docker container ids to be removed. Use this enum value as Redis key directly.
+    CONTAINER_TEARDOWN_QUEUE = enum.auto()
+    # Warm container pool of each image, the replenish lock, and sorted set of recently claimed container ids.
+    # Use CONTAINER_WARM_POOL_LOCK and CONTAINER_WARM_POOL_CLAIMED's enum values as Redis key directly.
+    CONTAINER_WARM_POOL = enum.auto()
+    CONTAINER_WARM_POOL_LOCK = enum.auto()
+    CONTAINER_WARM_POOL_CLAIMED = enum.auto()
+    # Exposed port bitmap, its next-fit cursor, port leases, and the bitmap rebuild lock.
+    # Use these enum values as Redis key directly.
+    CONTAINER_PORT_BITMAP = enum.auto()
+    CONTAINER_PORT_CURSOR = enum.auto()
+    CONTAINER_PORT_LEASE = enum.auto()
+    CONTAINER_PORT_REBUILD_LOCK = enum.auto()
+    # Lock and metrics hash of container reconciler. Use these enum values as Redis key directly.
+    CONTAINER_RECONCILE_LOCK = enum.auto()
+    CONTAINER_RECONCILE_METRICS = enum.auto()
+    # Lock of container status watcher. Use this enum value as Redis key directly.
+    CONTAINER_STATUS_WATCHER_LOCK = enum.auto()
 
     def as_redis_key(self, value: str):
         return f'{self.value}={str(value)}'
@@ -134,6 +171,33 @@ class DefaultModelMixin:
         return query_result
 
 
+# ---------- Keyset Pagination ----------
+def keyset_paginate(query: sqlorm.Query,
+                    key_column: typing.Any,
+                    cursor: typing.Optional[int] = None,
+                    limit: typing.Optional[int] = None) -> sqlorm.Query:
+    '''
+    Order query by key_column and return rows after the cursor.
+    One more row than limit is queried to know whether the next page exists, see split_keyset_page().
+    '''
+    if cursor is not None:
+        query = query.filter(key_column > cursor)
+    query = query.order_by(key_column)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+
+def split_keyset_page(rows: list[typing.Any],
+                      limit: typing.Optional[int],
+                      key_getter: typing.Callable[[typing.Any], int]) -> tuple[list[typing.Any], typing.Optional[int]]:
+    '''Returns rows of current page and the cursor of next page. Cursor will be None on the last page.'''
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, key_getter(rows[-1])
+
+
 def init_app(app: flask.Flask):
     # Connect to app context
     db.init_app(app)
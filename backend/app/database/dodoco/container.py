@@ -4,8 +4,10 @@ import docker.errors
 import docker.models.containers
 import docker.models.images
 import enum
+import io
 import pathlib as pt
 import secrets
+import sqlalchemy.orm as sqlorm
 import tarfile
 import tempfile
 import typing
@@ -14,6 +16,7 @@ import app.database as db_module
 import app.database.user as user_module
 import app.database.dodoco.project as ddc_db_project
 import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.port_allocator as ddc_port_allocator
 
 DockerClientType = docker.client.DockerClient
 DockerContainerType = docker.models.containers.Container
@@ -21,6 +24,9 @@ DockerImageType = docker.models.images.Image
 
 db = db_module.db
 docker_client = ddc_plugin_docker.docker_client
+# Archives of files up to this size are built on memory,
+# larger ones are built on an anonymous temporary file and streamed from it.
+archive_memory_max_size: int = 8 * 1024 * 1024
 
 
 class DockerPortProtocol(enum.Enum):
@@ -32,6 +38,9 @@ class DockerPortProtocol(enum.Enum):
 
 class Container(db.Model, db_module.DefaultModelMixin):
     __tablename__ = 'TB_CONTAINER'
+    __table_args__ = (
+        db.Index('IX_Container_ProjectID_UUID', 'project_id', 'uuid'),
+    )
     uuid = db.Column(db_module.PrimaryKeyType, db.Sequence('SQ_Container_UUID'), primary_key=True)
     name = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=True)
@@ -40,6 +49,11 @@ class Container(db.Model, db_module.DefaultModelMixin):
     start_image_name = db.Column(db.String, nullable=True)
     container_id = db.Column(db.String, nullable=True)
     container_name = db.Column(db.String, nullable=True, unique=True)
+    # Docker container state(created, running, paused, restarting, removing, exited, dead) cached on DB,
+    # and kept up to date by ddc_docker.status_watcher. 'removed' means Docker container is gone,
+    # and None means it's not observed yet.
+    status = db.Column(db.String, nullable=True)
+    status_changed_at = db.Column(db.DateTime, nullable=True)
 
     project_id = db.Column(db_module.PrimaryKeyType,
                            db.ForeignKey('TB_PROJECT.uuid', ondelete='CASCADE'),
@@ -56,6 +70,10 @@ class Container(db.Model, db_module.DefaultModelMixin):
 
     ports: list['ContainerPort'] = None  # backref placeholder
 
+    @staticmethod
+    def create_container_name(image_name: str) -> str:
+        return f'{[z for z in image_name.split(":") if z][0]}_{secrets.token_hex(16)}'
+
     def create(self,
                image_name: str,
                run_kwargs: typing.Optional[dict] = None,
@@ -64,12 +82,13 @@ class Container(db.Model, db_module.DefaultModelMixin):
                db_commit: bool = False) -> DockerContainerType:
 
         self.start_image_name = image_name
-        self.container_name = f'{[z for z in image_name.split(":") if z][0]}_{secrets.token_hex(16)}'
+        self.container_name = self.create_container_name(image_name)
         container_run_kwargs_result = {
             **(run_kwargs or {}),
             'name': self.container_name,
             'detach': True, 'stdin_open': True, 'tty': True,  # -dit
             'network_mode': 'bridge', 'ports': self.get_container_ports(),
+            'labels': {**(run_kwargs or {}).get('labels', {}), ddc_plugin_docker.managed_label: 'true', },
         }
         new_container: DockerContainerType = None
 
@@ -108,7 +127,8 @@ class Container(db.Model, db_module.DefaultModelMixin):
             image=target_image.tags[0],
             name=self.container_name,
             detach=True, stdin_open=True, tty=True,  # -dit
-            network_mode='bridge', ports=self.get_container_ports())
+            network_mode='bridge', ports=self.get_container_ports(),
+            labels={ddc_plugin_docker.managed_label: 'true', })
         self.container_id = target_container.id
 
         if start_after_recreate:
@@ -118,7 +138,7 @@ class Container(db.Model, db_module.DefaultModelMixin):
             db.session.commit()
 
     def get_container_obj(self) -> DockerContainerType:
-        return docker_client.containers.get(self.container_id)
+        return ddc_plugin_docker.docker_client.containers.get(self.container_id)
 
     def start(self):
         try:
@@ -150,6 +170,8 @@ class Container(db.Model, db_module.DefaultModelMixin):
         target_container.remove()
 
         # Remove all port records
+        exposed_ports = [row[0] for row in db.session.query(ContainerPort.exposed_port)
+                                                     .filter(ContainerPort.container_id == self.uuid).all()]
         db.session.query(ContainerPort).filter(ContainerPort.container_id == self.uuid).delete()
 
         # Remove self
@@ -157,6 +179,9 @@ class Container(db.Model, db_module.DefaultModelMixin):
 
         if db_commit:
             db.session.commit()
+            # Docker container is already removed, so the ports can be used again.
+            # If this is not committed here, ports are returned on next rebuild of port allocator.
+            ddc_port_allocator.release(exposed_ports)
 
     def commit(self, changes: str = None, start_after_commit: bool = False, db_commit: bool = False):
         # if the container is runnig, then we should stop first
@@ -203,18 +228,47 @@ class Container(db.Model, db_module.DefaultModelMixin):
             db.session.commit()
 
     def push_local_file(self, local_file_path: pt.Path, dest_path: str):
-        target_container = self.get_container_obj()
-
-        with tempfile.NamedTemporaryFile('wb', suffix='.tar', delete=False) as f:
-            with tarfile.open(fileobj=f, mode='w') as tar:
-                try:
-                    tar.add(local_file_path)
-                    print(tar.list())
-                finally:
-                    tar.close()
-
-            with pt.Path(f.name).open('rb') as fp:
-                target_container.put_archive(dest_path, fp.read())
+        self.push_local_files([local_file_path, ], dest_path)
+
+    def push_local_files(self, local_paths: typing.Iterable[pt.Path], dest_path: str):
+        '''
+        Upload local files and directories to dest_path of the container with one archive.
+        Each path is extracted by its name, so 'a/b/c' is extracted to 'dest_path/c'.
+        '''
+        local_paths = [pt.Path(local_path) for local_path in local_paths]
+        archive_size = 0
+        for local_path in local_paths:
+            if local_path.is_dir():
+                archive_size += sum(child.stat().st_size for child in local_path.rglob('*') if child.is_file())
+            else:
+                archive_size += local_path.stat().st_size
+
+        # Temporary file is removed on close, and docker-py streams the archive from it.
+        archive_file = io.BytesIO() if archive_size <= archive_memory_max_size else tempfile.TemporaryFile()
+        with archive_file:
+            with tarfile.open(fileobj=archive_file, mode='w') as tar:
+                for local_path in local_paths:
+                    tar.add(local_path, arcname=local_path.name)
+
+            archive_file.seek(0)
+            self.get_container_obj().put_archive(
+                dest_path, archive_file.getvalue() if isinstance(archive_file, io.BytesIO) else archive_file)
+
+    def push_file_data(self, file_data: dict[str, typing.Union[str, bytes]], dest_path: str, mode: int = 0o644):
+        '''Upload in-memory data as files to dest_path of the container, without writing those on local disk.'''
+        archive_file = io.BytesIO()
+        with tarfile.open(fileobj=archive_file, mode='w') as tar:
+            for file_name, file_content in file_data.items():
+                if isinstance(file_content, str):
+                    file_content = file_content.encode()
+
+                file_info = tarfile.TarInfo(file_name)
+                file_info.size = len(file_content)
+                file_info.mode = mode
+                file_info.mtime = int(datetime.datetime.now().timestamp())
+                tar.addfile(file_info, io.BytesIO(file_content))
+
+        self.get_container_obj().put_archive(dest_path, archive_file.getvalue())
 
     def execute_cmd(self, cmdline: str, stream: bool = False, demux: bool = True):
         target_container = self.get_container_obj()
@@ -264,7 +318,22 @@ class Container(db.Model, db_module.DefaultModelMixin):
             ports.update(container_port_record.to_docker_port_def())
         return ports
 
-    def to_dict(self):
+    @classmethod
+    def to_dict_load_options(cls, fields: typing.Optional[typing.Container[str]] = None) -> list[sqlorm.Load]:
+        '''Returns loader options for relationships that to_dict() touches with same arguments.'''
+        load_options: list[sqlorm.Load] = list()
+        if fields is None or 'created_by' in fields:
+            load_options.append(sqlorm.joinedload(cls.created_by))
+        if fields is None or 'project' in fields:
+            load_options.append(sqlorm.joinedload(cls.project).options(
+                *ddc_db_project.Project.to_dict_load_options(show_container=False)))
+        if fields is None or 'ports' in fields:
+            load_options.append(sqlorm.selectinload(cls.ports))
+        return load_options
+
+    def to_dict(self, fields: typing.Optional[typing.Container[str]] = None):
+        # If fields is given, only those fields(and resource, uuid) are included,
+        # and relationships not in fields are never loaded.
         result = {
             'resource': 'container',
             'uuid': self.uuid,
@@ -273,9 +342,10 @@ class Container(db.Model, db_module.DefaultModelMixin):
             'start_image_name': self.start_image_name,
             'container_id': self.container_id,
             'container_name': self.container_name,
+            'status': self.status,
+            'status_changed_at': self.status_changed_at,
 
             'created_by_id': self.created_by_id,
-            'created_by': self.created_by.to_dict(),
             'created_at': self.created_at,
             'modified_at': self.modified_at,
             'modified': self.created_at != self.modified_at,
@@ -283,9 +353,14 @@ class Container(db.Model, db_module.DefaultModelMixin):
             'modified_at_int': int(self.modified_at.replace(tzinfo=datetime.timezone.utc).timestamp()),
             'commit_id': self.commit_id,
         }
-        if self.project:
+        if fields is not None:
+            result = {k: v for k, v in result.items() if k in fields or k in ('resource', 'uuid')}
+
+        if fields is None or 'created_by' in fields:
+            result['created_by'] = self.created_by.to_dict()
+        if (fields is None or 'project' in fields) and self.project:
             result['project'] = self.project.to_dict(show_container=False)
-        if self.ports:
+        if (fields is None or 'ports' in fields) and self.ports:
             result['ports'] = [port.to_dict() for port in self.ports]
 
         return result
@@ -293,6 +368,9 @@ class Container(db.Model, db_module.DefaultModelMixin):
 
 class ContainerPort(db.Model):  # Container's exposed port management
     __tablename__ = 'TB_CONTAINER_PORT'
+    __table_args__ = (
+        db.Index('IX_ContainerPort_ContainerID', 'container_id'),
+    )
     uuid = db.Column(db_module.PrimaryKeyType, db.Sequence('SQ_ContainerPort_UUID'), primary_key=True)
 
     container_id = db.Column(db_module.PrimaryKeyType,
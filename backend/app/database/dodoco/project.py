@@ -14,6 +14,9 @@ db = db_module.db
 
 class ProjectTag(db.Model, db_module.DefaultModelMixin):
     __tablename__ = 'TB_PROJECT_TAG'
+    __table_args__ = (
+        db.Index('IX_ProjectTag_Code', 'code'),
+    )
     uuid = db.Column(db_module.PrimaryKeyType, db.Sequence('SQ_ProjectTag_UUID'), primary_key=True)
     name = db.Column(db.String, nullable=False)
     code = db.Column(db.String, nullable=False)
@@ -41,6 +44,14 @@ class ProjectTag(db.Model, db_module.DefaultModelMixin):
 
 class Project(db.Model, db_module.DefaultModelMixin):
     __tablename__ = 'TB_PROJECT'
+    __table_args__ = (
+        db.Index('IX_Project_TagID', 'tag_id'),
+        db.Index('IX_Project_DeletedAt', 'deleted_at'),
+        # Most queries only look for live projects, and those are small part of the table.
+        db.Index('IX_Project_Live_TagID_UUID', 'tag_id', 'uuid',
+                 postgresql_where=db.text('deleted_at IS NULL AND frozen_at IS NULL'),
+                 sqlite_where=db.text('deleted_at IS NULL AND frozen_at IS NULL')),
+    )
     uuid = db.Column(db_module.PrimaryKeyType, db.Sequence('SQ_Project_UUID'), primary_key=True)
     name = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=True)
@@ -72,7 +83,15 @@ class Project(db.Model, db_module.DefaultModelMixin):
                       query_all: bool = False,
                       show_deleted: bool = False,
                       show_frozen: bool = False,
-                      uuid_only: bool = False) -> sqlorm.Query:
+                      uuid_only: bool = False,
+                      cursor: typing.Optional[int] = None,
+                      limit: typing.Optional[int] = None,
+                      to_dict_kwargs: typing.Optional[dict[str, typing.Any]] = None) -> sqlorm.Query:
+        '''
+        Build project query. If cursor or limit is given, result will be ordered by uuid and paginated,
+        see db_module.keyset_paginate().
+        If to_dict_kwargs is given, everything that to_dict(**to_dict_kwargs) touches will be loaded eagerly.
+        '''
         if not query_all and user_id is None:
             raise Exception('One of user_id or query_all must be set')
 
@@ -80,51 +99,107 @@ class Project(db.Model, db_module.DefaultModelMixin):
             project_query = db.session.query(cls.uuid)
         else:
             project_query = db.session.query(cls)
+            if to_dict_kwargs is not None:
+                project_query = project_query.options(*cls.to_dict_load_options(**to_dict_kwargs))
 
         if not show_deleted:
             project_query = project_query.filter(cls.deleted_at.is_(None))
         if not show_frozen:
             project_query = project_query.filter(cls.frozen_at.is_(None))
 
-        # If query_all_projects not enabled, then limit query result to user-participated projects
+        # If query_all_projects not enabled, then limit query result to user-participated projects.
+        # This is checked with EXISTS, which can be resolved with IX_ProjectMember_UserID_ProjectID only.
         if not query_all:
-            member_uuid_query = db.session.query(ProjectMember.project_id)\
+            member_exists_query = db.session.query(ProjectMember.uuid)\
+                .filter(ProjectMember.project_id == cls.uuid)\
                 .filter(ProjectMember.user_id == user_id)\
-                .distinct().subquery()
-            project_query = project_query.filter(cls.uuid.in_(member_uuid_query))
+                .exists()
+            project_query = project_query.filter(member_exists_query)
 
         if project_id is None:
             # Apply tag on filter if tag query is available
             if tag:
-                tag_uuid_query = db.session.query(ProjectTag.uuid)
+                project_query = project_query.join(ProjectTag, cls.tag_id == ProjectTag.uuid)
                 if isinstance(tag, list):
-                    tag_uuid_query = tag_uuid_query.filter(ProjectTag.code.in_(tag))
+                    project_query = project_query.filter(ProjectTag.code.in_(tag))
                 else:
-                    tag_uuid_query = tag_uuid_query.filter(ProjectTag.code.like(tag))
-                tag_uuid_query = tag_uuid_query.subquery()
-
-                project_query = project_query.filter(cls.tag_id.in_(tag_uuid_query))
+                    project_query = project_query.filter(ProjectTag.code.like(tag))
 
         else:
             project_query = project_query.filter(cls.uuid == project_id)
 
+        if cursor is not None or limit is not None:
+            project_query = db_module.keyset_paginate(project_query, cls.uuid, cursor, limit)
+
         return project_query
 
-    def freeze(self, frozen_time: typing.Optional[datetime.datetime], commit: bool = False):
+    def freeze(self,
+               frozen_time: typing.Optional[datetime.datetime],
+               commit: bool = False) -> tuple[list[str], list[int]]:
+        '''
+        Freeze project and delete all container records of the project with bulk queries.
+        Docker containers are not touched here, and ids of those and their exposed ports are returned.
+        Pass those to ddc_provisioner.enqueue_teardown() after commit, this is done automatically if commit is True.
+        '''
+        import app.database.dodoco.container as ddc_db_container  # noqa
+        import app.plugin.ddc_docker.provisioner as ddc_provisioner  # noqa
+
         if not frozen_time:
             frozen_time = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
 
         self.frozen_at = frozen_time
 
-        if self.containers:
-            for container in self.containers:
-                if container:
-                    container.destroy(False)
+        container_uuid_query = db.session.query(ddc_db_container.Container.uuid)\
+            .filter(ddc_db_container.Container.project_id == self.uuid)
+        docker_container_ids: list[str] = [
+            row[0] for row in db.session.query(ddc_db_container.Container.container_id)
+                                        .filter(ddc_db_container.Container.project_id == self.uuid)
+                                        .filter(ddc_db_container.Container.container_id.isnot(None))
+                                        .all()]
+        exposed_ports: list[int] = [
+            row[0] for row in db.session.query(ddc_db_container.ContainerPort.exposed_port)
+                                        .filter(ddc_db_container.ContainerPort.container_id.in_(
+                                            container_uuid_query.scalar_subquery()))
+                                        .distinct().all()]
+
+        db.session.query(ddc_db_container.ContainerPort)\
+            .filter(ddc_db_container.ContainerPort.container_id.in_(container_uuid_query.scalar_subquery()))\
+            .delete(synchronize_session=False)
+        db.session.query(ddc_db_container.Container)\
+            .filter(ddc_db_container.Container.project_id == self.uuid)\
+            .delete(synchronize_session=False)
+        db.session.expire(self, ['containers'])
 
         if commit:
             db.session.commit()
+            ddc_provisioner.enqueue_teardown(docker_container_ids, exposed_ports)
+
+        return docker_container_ids, exposed_ports
 
-    def to_dict(self, show_container: bool = True):
+    @classmethod
+    def to_dict_load_options(cls,
+                             show_container: bool = True,
+                             fields: typing.Optional[typing.Container[str]] = None) -> list[sqlorm.Load]:
+        '''
+        Returns loader options for relationships that to_dict() touches with same arguments.
+        Collections are loaded with selectinload, so that query count doesn't grow with result rows.
+        '''
+        import app.database.dodoco.container as ddc_db_container  # noqa
+
+        load_options: list[sqlorm.Load] = list()
+        if fields is None or 'tag' in fields:
+            load_options.append(sqlorm.joinedload(cls.tag))
+        if fields is None or 'members' in fields:
+            load_options.append(sqlorm.selectinload(cls.members).joinedload(ProjectMember.user))
+        if show_container and (fields is None or 'containers' in fields):
+            container_load = sqlorm.selectinload(cls.containers)
+            load_options.append(container_load.joinedload(ddc_db_container.Container.created_by))
+            load_options.append(container_load.selectinload(ddc_db_container.Container.ports))
+        return load_options
+
+    def to_dict(self, show_container: bool = True, fields: typing.Optional[typing.Container[str]] = None):
+        # If fields is given, only those fields(and resource, uuid) are included,
+        # and relationships not in fields are never loaded.
         result = {
             'resource': 'project',
             'uuid': self.uuid,
@@ -134,7 +209,6 @@ class Project(db.Model, db_module.DefaultModelMixin):
             'max_container_limit': self.max_container_limit,
 
             'tag_id': self.tag_id,
-            'tag': self.tag.to_dict(),
 
             'created_at': self.created_at,
             'modified_at': self.modified_at,
@@ -143,11 +217,16 @@ class Project(db.Model, db_module.DefaultModelMixin):
             'modified_at_int': int(self.modified_at.replace(tzinfo=datetime.timezone.utc).timestamp()),
             'commit_id': self.commit_id,
         }
-        if show_container and self.containers:
-            result['containers'] = [container.to_dict() for container in self.containers]
         if self.frozen_at:
             result['frozen_at'] = self.frozen_at
-        if self.members:
+        if fields is not None:
+            result = {k: v for k, v in result.items() if k in fields or k in ('resource', 'uuid')}
+
+        if fields is None or 'tag' in fields:
+            result['tag'] = self.tag.to_dict()
+        if show_container and (fields is None or 'containers' in fields) and self.containers:
+            result['containers'] = [container.to_dict() for container in self.containers]
+        if (fields is None or 'members' in fields) and self.members:
             result['members'] = [member.to_dict() for member in self.members]
 
         return result
@@ -155,6 +234,12 @@ class Project(db.Model, db_module.DefaultModelMixin):
 
 class ProjectMember(db.Model):
     __tablename__ = 'TB_PROJECT_MEMBER'
+    __table_args__ = (
+        # Membership check(user -> projects), which also covers user_id only lookups.
+        db.Index('IX_ProjectMember_UserID_ProjectID', 'user_id', 'project_id'),
+        # Member list of projects(project -> users)
+        db.Index('IX_ProjectMember_ProjectID_UserID', 'project_id', 'user_id'),
+    )
     uuid = db.Column(db_module.PrimaryKeyType, db.Sequence('SQ_ProjectMember_UUID'), primary_key=True)
     accepted = db.Column(db.Boolean, nullable=False, default=False)
 
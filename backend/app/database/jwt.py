@@ -1,13 +1,23 @@
 import datetime
 import flask
-import inspect
+import functools
+import hashlib
+import hmac
+import json
 import jwt
 import jwt.exceptions
+import operator
 import redis
+import sqlalchemy as sql
+import sqlalchemy.event as sqlevent
+import sqlalchemy.orm as sqlorm
 import user_agents as ua
 import user_agents.parsers as ua_parser
+import threading
+import time
 import typing
 
+import app.common.jwt_keyring as jwt_keyring_module
 import app.common.utils as utils
 import app.database as db_module
 import app.database.user as user_module
@@ -22,9 +32,238 @@ refresh_token_valid_duration: datetime.timedelta = datetime.timedelta(days=61)
 access_token_valid_duration: datetime.timedelta = datetime.timedelta(hours=1)
 # Admin token will expire after 12 hours
 admin_token_valid_duration: datetime.timedelta = datetime.timedelta(hours=12)
+# Revoked mark of token will be kept for 2 weeks
+token_revoke_duration: datetime.timedelta = datetime.timedelta(weeks=2)
 
 allowed_claim_in_jwt: list[str] = ['api_ver', 'iss', 'exp', 'user', 'sub', 'jti', 'role']
 
+# Tokens are signed with private keys on key ring when asymmetric algorithm is set,
+# else tokens are signed with the key given by caller.
+jwt_keyring: typing.Optional[jwt_keyring_module.JWTKeyRing] = None
+jwt_algorithm: str = flask.current_app.config.get('JWT_ALGORITHM', 'HS256')
+if jwt_algorithm in jwt_keyring_module.asymmetric_algorithms:
+    if not flask.current_app.config.get('JWT_KEYRING_PATH', None):
+        raise ValueError(f'JWT_KEYRING_PATH must be set when JWT_ALGORITHM is {jwt_algorithm}')
+    jwt_keyring = jwt_keyring_module.JWTKeyRing(flask.current_app.config.get('JWT_KEYRING_PATH'), jwt_algorithm)
+elif jwt_algorithm != 'HS256':
+    raise ValueError(
+        f'JWT_ALGORITHM must be one of <HS256, {", ".join(jwt_keyring_module.asymmetric_algorithms)}>, '
+        f'not {jwt_algorithm}')
+
+# Already verified access tokens, keyed by digest of (token + key).
+# Cached entry expires on token's exp, or after ACCESS_TOKEN_CACHE_TTL seconds to re-check revocation.
+access_token_cache: utils.TTLCache = utils.TTLCache(flask.current_app.config.get('ACCESS_TOKEN_CACHE_SIZE', 4096))
+access_token_cache_ttl: int = flask.current_app.config.get('ACCESS_TOKEN_CACHE_TTL', 10)
+
+refresh_token_cache_enable: bool = flask.current_app.config.get('REFRESH_TOKEN_CACHE_ENABLE', False)
+# User columns stored on refresh token validation cache, see RefreshToken.get_user_snapshot().
+# Those must cover User.to_dict(), role and lock/deactivation state.
+refresh_token_cache_user_datetime_columns: tuple[str, ...] = (
+    'created_at', 'modified_at', 'locked_at', 'deactivated_at')
+refresh_token_cache_user_columns: tuple[str, ...] = (
+    'uuid', 'id', 'nickname', 'email', 'description', 'profile_image', 'role',
+    *refresh_token_cache_user_datetime_columns)
+
+# KEYS[1]: revoked JTI index(sorted set), KEYS[2]: revocation version counter
+# ARGV[1]: revoke key prefix, ARGV[2]: revoke mark TTL in seconds, ARGV[3]: max index size, ARGV[4...]: JTIs
+token_revoke_script = redis_db.register_script('''
+local version = 0
+for i = 4, #ARGV do
+    version = redis.call('INCR', KEYS[2])
+    redis.call('SET', ARGV[1] .. ARGV[i], 'revoked', 'EX', tonumber(ARGV[2]))
+    redis.call('ZADD', KEYS[1], version, ARGV[i])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[3]) + 1))
+return version
+''')
+# KEYS[1]: revoke mark key. Deletes the key only if the token is marked as revoked.
+token_unrevoke_script = redis_db.register_script('''
+if redis.call('GET', KEYS[1]) == 'revoked' then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+''')
+
+
+class TokenRevocationIndex:
+    '''
+    Worker-local mirror of revoked token JTIs.
+    Every revocation is recorded on a Redis sorted set scored by an increasing version,
+    and this index fetches only the records newer than the version it saw last time.
+    Redis needs to be asked only when the bloom filter hits.
+    '''
+    # Filter is rebuilt with a capacity that keeps live revocations under this ratio of it.
+    rebuild_load: float = 0.5
+
+    def __init__(self, sync_interval: float, capacity: int):
+        self.sync_interval: float = sync_interval
+        self.capacity: int = capacity
+
+        self._filter: utils.BloomFilter = utils.BloomFilter(capacity)
+        self._version: int = -1  # -1 means that this index never synced with Redis
+        self._synced_at: float = 0.0
+        self._lock: threading.Lock = threading.Lock()
+
+    def rebuild(self):
+        # Get the version first, revocations after this will be fetched on next sync.
+        redis_version = int(redis_db.get(RedisKeyType.TOKEN_REVOKE_VERSION.value) or 0)
+
+        # Index can be trimmed, so revoked marks are the source of truth.
+        revoke_key_prefix = RedisKeyType.TOKEN_REVOKE.as_redis_key('')
+        revoked_jtis = [
+            redis_key.decode().replace(revoke_key_prefix, '', 1)
+            for redis_key in redis_db.scan_iter(match=RedisKeyType.TOKEN_REVOKE.as_redis_key('*'), count=1000)]
+
+        # Size the filter from the live revocations, otherwise the filter is full right after rebuild
+        # when there are more live revocations than the configured capacity, and it is rebuilt on every sync.
+        filter_capacity = max(self.capacity, 1 << int(len(revoked_jtis) / self.rebuild_load).bit_length())
+        new_filter = utils.BloomFilter(filter_capacity)
+        for jti in revoked_jtis:
+            new_filter.add(jti)
+
+        self._filter = new_filter
+        self._version = redis_version
+
+    def sync(self, force: bool = False):
+        if not force and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+
+        with self._lock:
+            if not force and time.monotonic() - self._synced_at < self.sync_interval:
+                return
+
+            if self._version < 0:
+                self.rebuild()
+            else:
+                redis_pipeline = redis_db.pipeline(transaction=False)
+                redis_pipeline.get(RedisKeyType.TOKEN_REVOKE_VERSION.value)
+                redis_pipeline.zrangebyscore(
+                    RedisKeyType.TOKEN_REVOKE_INDEX.value, f'({self._version}', '+inf', withscores=True)
+                redis_version, new_revocations = redis_pipeline.execute()
+                redis_version = int(redis_version or 0)
+
+                if redis_version < self._version:
+                    # Redis DB was flushed
+                    self.rebuild()
+                elif redis_version > self._version:
+                    if not new_revocations or int(new_revocations[0][1]) != self._version + 1:
+                        # Some revocations were trimmed from index before we fetch it
+                        self.rebuild()
+                    else:
+                        for jti, _ in new_revocations:
+                            self._filter.add(jti.decode())
+                        self._version = int(new_revocations[-1][1])
+
+                        if self._filter.is_full():
+                            # Drop revoked marks that already expired by rebuilding filter.
+                            self.rebuild()
+
+            self._synced_at = time.monotonic()
+
+    def add(self, jti: int):
+        # Revocation on this worker must be applied immediately.
+        self._filter.add(str(jti))
+
+    def is_revoked(self, jti: int) -> bool:
+        self.sync()
+        if str(jti) not in self._filter:
+            return False
+
+        redis_result = redis_db.get(RedisKeyType.TOKEN_REVOKE.as_redis_key(jti))
+        return bool(redis_result and redis_result == b'revoked')
+
+
+token_revocation_index: TokenRevocationIndex = TokenRevocationIndex(
+    flask.current_app.config.get('TOKEN_REVOKE_INDEX_SYNC_INTERVAL', 1.0),
+    flask.current_app.config.get('TOKEN_REVOKE_INDEX_CAPACITY', 65536))
+
+
+@functools.lru_cache(maxsize=4096)
+def user_agent_fingerprint(user_agent: str) -> str:
+    '''
+    Returns compact form of parsed User-Agent, like `010|iOS|Mobile Safari`.
+    First part is flags of (mobile, tablet, PC), and then OS family and browser family follows.
+    Parsing User-Agent is expensive, so results are cached.
+    '''
+    parsed_ua: ua_parser.UserAgent = ua.parse(user_agent)
+    device_flags = ''.join('1' if flag else '0' for flag in (parsed_ua.is_mobile, parsed_ua.is_tablet, parsed_ua.is_pc))
+    return '|'.join((device_flags, parsed_ua.os.family, parsed_ua.browser.family))
+
+
+def is_user_agent_compatible(db_fingerprint: str, req_fingerprint: str) -> bool:
+    db_device, db_os, db_browser = db_fingerprint.split('|', 2)
+    req_device, req_os, req_browser = req_fingerprint.split('|', 2)
+
+    return all((
+        any(db_flag == req_flag for db_flag, req_flag in zip(db_device, req_device)),
+        db_os == req_os,
+        db_browser == req_browser,
+    ))
+
+
+def key_binding_hash(csrf_token: str) -> str:
+    # Access tokens must be bound to CSRF token. On HS256, CSRF token is a part of the signing key,
+    # but this is not possible on asymmetric keys, so the token carries a hash of the CSRF token instead.
+    # This doesn't depend on SECRET_KEY, so anyone who has the public keys can verify the binding.
+    return hashlib.sha256(csrf_token.encode()).hexdigest()
+
+
+def encode_jwt(payload: dict, key: str, algorithm: str = 'HS256', csrf_token: str = '') -> str:
+    if not jwt_keyring:
+        return jwt.encode(payload=payload, key=key+csrf_token, algorithm=algorithm)
+
+    signing_key = jwt_keyring.get_signing_key()
+    return jwt.encode(
+        payload={**payload, 'kbh': key_binding_hash(csrf_token)},
+        key=signing_key.private_key,
+        algorithm=signing_key.algorithm,
+        headers={'kid': signing_key.kid, })
+
+
+def decode_jwt(jwt_input: str, key: str, algorithm: str = 'HS256', csrf_token: str = '') -> dict:
+    if not jwt_keyring:
+        return jwt.decode(jwt_input, key=key+csrf_token, algorithms=algorithm)
+
+    try:
+        verify_key = jwt_keyring.get_verify_key(jwt.get_unverified_header(jwt_input).get('kid', None))
+    except KeyError as err:
+        raise jwt.exceptions.InvalidTokenError(str(err))
+
+    token_data = jwt.decode(jwt_input, key=verify_key.public_key, algorithms=[verify_key.algorithm, ])
+    if not hmac.compare_digest(str(token_data.get('kbh', '')), key_binding_hash(csrf_token)):
+        raise jwt.exceptions.InvalidTokenError('Token key binding mismatch')
+    return token_data
+
+
+def revoke_tokens(jtis: typing.Iterable[int],
+                  ttl: datetime.timedelta = token_revoke_duration,
+                  delete_refresh_token: bool = True,
+                  db_commit: bool = False):
+    '''
+    Revoke all tokens which have given JTIs, with a single Redis script call.
+    Matching refresh token rows are also removed with a single DELETE query if delete_refresh_token is set.
+    '''
+    jtis = [int(jti) for jti in jtis]
+    if not jtis:
+        return
+
+    token_revoke_script(
+        keys=[RedisKeyType.TOKEN_REVOKE_INDEX.value, RedisKeyType.TOKEN_REVOKE_VERSION.value],
+        args=[RedisKeyType.TOKEN_REVOKE.as_redis_key(''), int(ttl.total_seconds()),
+              token_revocation_index.capacity, *jtis])
+    for jti in jtis:
+        token_revocation_index.add(jti)
+
+    if delete_refresh_token:
+        if refresh_token_cache_enable:
+            redis_db.delete(*[RedisKeyType.REFRESH_TOKEN_CACHE.as_redis_key(jti) for jti in jtis])
+        db.session.query(RefreshToken)\
+            .filter(RefreshToken.jti.in_(jtis))\
+            .delete(synchronize_session=False)
+
+    if db_commit:
+        db.session.commit()
+
 
 class TokenBase:
     # This will raise error when env var "RESTAPI_VERSION" not set.
@@ -44,13 +283,22 @@ class TokenBase:
     role: str = ''
     # data: dict
 
+    # Claims that will be included in JWT, and a getter of those claims.
+    # Getter is built once when the class is created, so that we don't need to walk all members on every issue.
+    _claim_names: tuple[str] = tuple(allowed_claim_in_jwt)
+    _claim_getter: typing.Callable[['TokenBase'], tuple] = operator.attrgetter(*allowed_claim_in_jwt)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._claim_getter = operator.attrgetter(*cls._claim_names)
+
     def is_admin(self):
         json_result = utils.safe_json_loads(self.role)
         if json_result and 'admin' in json_result:
             return True
         return False
 
-    def create_token(self, key: str, algorithm: str = 'HS256') -> str:
+    def create_token(self, key: str, algorithm: str = 'HS256', csrf_token: str = '') -> str:
         if not self.sub:
             raise jwt.exceptions.MissingRequiredClaimError('Subject not set in JWT class')
         if self.user and type(self.user) == int and self.user < 0:
@@ -71,18 +319,13 @@ class TokenBase:
         if (not token_exp_time) or (token_exp_time < current_time):
             raise jwt.exceptions.ExpiredSignatureError('Token has reached expiration time')
 
-        result_payload = dict()
-        attrs = inspect.getmembers(self, lambda o: not callable(o))
-
-        for attr_name, attr_value in attrs:
-            if attr_name in allowed_claim_in_jwt:
-                result_payload[attr_name] = attr_value
+        result_payload = dict(zip(self._claim_names, self._claim_getter(self)))
 
-        return jwt.encode(payload=result_payload, key=key, algorithm=algorithm)
+        return encode_jwt(result_payload, key, algorithm, csrf_token)
 
     @classmethod
-    def from_token(cls, jwt_input: str, key: str, algorithm: str = 'HS256') -> 'TokenBase':
-        token_data = jwt.decode(jwt_input, key=key, algorithms=algorithm)
+    def from_token(cls, jwt_input: str, key: str, algorithm: str = 'HS256', csrf_token: str = '') -> 'TokenBase':
+        token_data = decode_jwt(jwt_input, key, algorithm, csrf_token)
 
         current_api_ver: str = flask.current_app.config.get('RESTAPI_VERSION')
         if token_data.get('api_ver', '') != current_api_ver:
@@ -121,30 +364,47 @@ class AccessToken(TokenBase):
 
     _refresh_token: 'RefreshToken' = None
 
-    def create_token(self, key: str, algorithm: str = 'HS256', exp_reset: bool = True) -> str:
-        if not RefreshToken.query.filter(RefreshToken.jti == self.jti).first():
-            raise Exception('Access Token could not be issued')
+    def create_token(self,
+                     key: str,
+                     algorithm: str = 'HS256',
+                     exp_reset: bool = True,
+                     csrf_token: str = '') -> str:
+        # Token created by from_refresh_token() holds the refresh token that caller already validated,
+        # so we need to check the refresh token only when it's not given.
+        if self._refresh_token is None or self._refresh_token.jti != self.jti:
+            if not RefreshToken.query.get(self.jti):
+                raise Exception('Access Token could not be issued')
 
-        new_token = super().create_token(key, algorithm=algorithm)
+        new_token = super().create_token(key, algorithm=algorithm, csrf_token=csrf_token)
 
         # If new token safely issued, then remove revoked history
-        redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(self.jti)
-        redis_result = redis_db.get(redis_key)
-        if redis_result and redis_result == b'revoked':
-            redis_db.delete(redis_key)
+        token_unrevoke_script(keys=[RedisKeyType.TOKEN_REVOKE.as_redis_key(self.jti), ])
 
         return new_token
 
     @classmethod
-    def from_token(cls, jwt_input: str, key: str, algorithm: str = 'HS256') -> 'AccessToken':
-        parsed_token = super().from_token(jwt_input, key, algorithm)
+    def from_token(cls, jwt_input: str, key: str, algorithm: str = 'HS256', csrf_token: str = '') -> 'AccessToken':
+        # CSRF token must be a part of cache key, as access token is bound to CSRF token.
+        cache_key = hashlib.sha256(f'{algorithm}\0{key}\0{csrf_token}\0{jwt_input}'.encode()).digest()
+        cached_token_data: typing.Optional[dict] = access_token_cache.get(cache_key)
+        if cached_token_data is not None:
+            if token_revocation_index.is_revoked(cached_token_data['jti']):
+                access_token_cache.pop(cache_key)
+                raise jwt.exceptions.InvalidTokenError('This token was revoked')
+
+            cached_token = cls()
+            cached_token.__dict__.update(cached_token_data)
+            return cached_token
+
+        parsed_token = super().from_token(jwt_input, key, algorithm, csrf_token)
 
         # Check if token's revoked
-        redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(parsed_token.jti)
-        redis_result = redis_db.get(redis_key)
-        if redis_result and redis_result == b'revoked':
+        if token_revocation_index.is_revoked(parsed_token.jti):
             raise jwt.exceptions.InvalidTokenError('This token was revoked')
 
+        access_token_cache.set(
+            cache_key, dict(parsed_token.__dict__),
+            min(parsed_token.exp.timestamp(), time.time() + access_token_cache_ttl))
         return parsed_token
 
     @classmethod
@@ -170,7 +430,7 @@ class AccessToken(TokenBase):
         # Access token's JTI must be same with Refresh token's.
         new_token.jti = refresh_token.jti
         # role field must be refreshed from TB_USER
-        new_token.role = refresh_token.usertable.role
+        new_token.role = refresh_token.get_user_snapshot().role
 
         return new_token
 
@@ -203,10 +463,18 @@ class RefreshToken(TokenBase, db.Model, db_module.DefaultModelMixin):
                                                        order_by='RefreshToken.modified_at.desc()'))
 
     user_agent = db.Column(db.String, nullable=False)
+    # Parsed User-Agent on issue time, see user_agent_fingerprint().
+    user_agent_fingerprint = db.Column(db.String, nullable=True)
     # Token data for sending notification on specific client device.
     # Only available on mobile.
     client_token = db.Column(db.String, nullable=True)
 
+    # Token restored from validation cache is not bound to DB session,
+    # use get_user(), get_user_snapshot() and to_persistent() instead of relationship or modifying it.
+    _from_cache: bool = False
+    _cached_user: typing.Optional[user_module.User] = None
+    _cached_user_snapshot: typing.Optional[dict[str, typing.Any]] = None
+
     @classmethod
     def from_usertable(cls, userdata: user_module.User) -> 'RefreshToken':
         new_token = cls()
@@ -218,7 +486,7 @@ class RefreshToken(TokenBase, db.Model, db_module.DefaultModelMixin):
 
     @classmethod
     def from_token(cls, jwt_input: str, key: str, algorithm: str = 'HS256') -> 'RefreshToken':
-        token_data = jwt.decode(jwt_input, key=key, algorithms=algorithm)
+        token_data = decode_jwt(jwt_input, key, algorithm)
         current_time: datetime.datetime = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
 
         current_api_ver: str = flask.current_app.config.get('RESTAPI_VERSION')
@@ -227,8 +495,15 @@ class RefreshToken(TokenBase, db.Model, db_module.DefaultModelMixin):
         if token_data.get('sub', '') != cls.sub:
             raise jwt.exceptions.InvalidTokenError('Token sub mismatch')
 
+        if refresh_token_cache_enable:
+            cached_token = cls.from_validation_cache(token_data, current_time)
+            if cached_token:
+                return cached_token
+
         # Get token using JTI, but only
-        target_token = RefreshToken.query.filter(RefreshToken.jti == token_data.get('jti', -1))\
+        # User is also loaded in same query, as almost every caller of this needs user data.
+        target_token = RefreshToken.query.options(sqlorm.joinedload(RefreshToken.usertable))\
+                                         .filter(RefreshToken.jti == token_data.get('jti', -1))\
                                          .filter(RefreshToken.exp > current_time)\
                                          .first()
         if not target_token:
@@ -245,6 +520,10 @@ class RefreshToken(TokenBase, db.Model, db_module.DefaultModelMixin):
         cookie_token_exp = datetime.datetime.fromtimestamp(token_data.get('exp', 0), utils.UTC)
 
         if target_token.user == int(token_data.get('user', '')) and db_token_exp == cookie_token_exp:
+            if refresh_token_cache_enable:
+                # Warm up the cache on miss, so that next validation doesn't hit DB.
+                # Only tokens that passed all checks are cached.
+                target_token.set_validation_cache()
             return target_token
         else:
             raise jwt.exceptions.InvalidTokenError('RefreshToken information mismatch')
@@ -264,7 +543,144 @@ class RefreshToken(TokenBase, db.Model, db_module.DefaultModelMixin):
             db.session.rollback()
             raise
 
-        return super().create_token(key, algorithm)
+        new_token = super().create_token(key, algorithm)
+        if refresh_token_cache_enable:
+            self.set_validation_cache()
+        return new_token
+
+    @classmethod
+    def from_validation_cache(cls, token_data: dict, current_time: datetime.datetime)\
+            -> typing.Optional['RefreshToken']:
+        '''
+        Restore refresh token from validation cache.
+        None will be returned if the cache is missing or doesn't match with the token,
+        so that caller can fall back to DB which is the source of truth.
+        '''
+        cached_data = redis_db.get(RedisKeyType.REFRESH_TOKEN_CACHE.as_redis_key(token_data.get('jti', -1)))
+        if not cached_data:
+            return None
+
+        cached_data: dict = json.loads(cached_data)
+        if cached_data['exp'] != token_data.get('exp', 0) or cached_data['user'] != int(token_data.get('user', -1)):
+            return None
+        if cached_data['exp'] <= current_time.timestamp():
+            return None
+
+        # This token is transient, so it won't be written to DB even if it's modified.
+        cached_token = cls()
+        cached_token._from_cache = True
+        cached_token.jti = int(token_data['jti'])
+        cached_token.user = cached_data['user']
+        cached_token.exp = datetime.datetime.fromtimestamp(cached_data['exp'], utils.UTC).replace(tzinfo=None)
+        cached_token.role = cached_data['role']
+        cached_token.user_agent_fingerprint = cached_data['user_agent_fingerprint']
+        cached_token.client_token = cached_data['client_token']
+        # Entries written before user snapshot was added don't have it, get_user_snapshot() falls back to DB.
+        cached_token._cached_user_snapshot = cached_data.get('user_snapshot', None)
+        return cached_token
+
+    def set_validation_cache(self):
+        token_exp = int(self.exp.replace(tzinfo=utils.UTC).timestamp())
+        cache_ttl = token_exp - int(time.time())
+        if cache_ttl <= 0:
+            return
+
+        redis_db.set(
+            RedisKeyType.REFRESH_TOKEN_CACHE.as_redis_key(self.jti),
+            json.dumps({
+                'user': self.user,
+                'exp': token_exp,
+                'role': self.role,
+                'user_agent_fingerprint': self.user_agent_fingerprint or user_agent_fingerprint(self.user_agent),
+                'client_token': self.client_token,
+                'user_snapshot': {
+                    column_name: column_value.isoformat() if isinstance(column_value, datetime.datetime)
+                    else column_value
+                    for column_name in refresh_token_cache_user_columns
+                    for column_value in (getattr(self.usertable, column_name), )},
+            }),
+            ex=cache_ttl)
+
+    def get_user(self) -> typing.Optional[user_module.User]:
+        '''Returns user which is bound to DB session. This always hits DB if the token is from validation cache.'''
+        if not self._from_cache:
+            return self.usertable
+        if self._cached_user is None:
+            self._cached_user = user_module.User.query.get(self.user)
+        return self._cached_user
+
+    def get_user_snapshot(self) -> typing.Optional[user_module.User]:
+        '''
+        Returns user for read-only usage like checking lock/deactivation, role and to_dict().
+        If the token is from validation cache, this is a transient User built from the cache without hitting DB.
+        Never modify it or attach it to DB session, use get_user() for that.
+        '''
+        if not self._from_cache or self._cached_user_snapshot is None:
+            return self.get_user()
+
+        return user_module.User(**{
+            column_name: datetime.datetime.fromisoformat(column_value)
+            if column_name in refresh_token_cache_user_datetime_columns and column_value else column_value
+            for column_name, column_value in self._cached_user_snapshot.items()})
+
+    def to_persistent(self) -> 'RefreshToken':
+        '''
+        Returns refresh token which is bound to DB session.
+        Token restored from validation cache must be converted with this before modifying it.
+        '''
+        if not self._from_cache:
+            return self
+
+        target_token = RefreshToken.query.get(self.jti)
+        if not target_token:
+            raise jwt.exceptions.InvalidTokenError('RefreshToken not found on DB')
+        return target_token
+
+
+# Modified or deleted refresh tokens must not be validated with stale cache.
+# Bulk queries(ex: revoke_tokens()) don't emit these events, so those have to drop the cache by themselves.
+@sqlevent.listens_for(RefreshToken, 'after_update')
+@sqlevent.listens_for(RefreshToken, 'after_delete')
+def drop_refresh_token_validation_cache(mapper, connection, target: RefreshToken):
+    if refresh_token_cache_enable:
+        redis_db.delete(RedisKeyType.REFRESH_TOKEN_CACHE.as_redis_key(target.jti))
+
+
+# Validation cache holds user snapshot, so cache of all tokens of the user must be dropped
+# when the user is modified(locked, deactivated, password or profile changed) or deleted.
+# Cache is dropped after commit, as cache miss before commit will fill the cache with old user data.
+@sqlevent.listens_for(user_module.User, 'after_update')
+@sqlevent.listens_for(user_module.User, 'after_delete')
+def mark_user_validation_cache_dirty(mapper, connection, target: user_module.User):
+    if not refresh_token_cache_enable:
+        return
+
+    target_session = sqlorm.object_session(target)
+    if target_session is None:
+        return
+    # Login updates last_login_date on every sign-in, that must not drop the cache.
+    target_state = sql.inspect(target)
+    if not target_state.deleted and not any(
+            target_state.attrs[column_name].history.has_changes()
+            for column_name in (*refresh_token_cache_user_columns, 'password')):
+        return
+
+    user_token_jtis = connection.execute(
+        sql.select(RefreshToken.jti).where(RefreshToken.user == target.uuid)).scalars().all()
+    target_session.info.setdefault('dirty_refresh_token_cache_keys', set()).update(
+        RedisKeyType.REFRESH_TOKEN_CACHE.as_redis_key(jti) for jti in user_token_jtis)
+
+
+@sqlevent.listens_for(sqlorm.Session, 'after_commit')
+def drop_dirty_user_validation_cache(session: sqlorm.Session):
+    dirty_cache_keys: set[str] = session.info.pop('dirty_refresh_token_cache_keys', None)
+    if dirty_cache_keys:
+        redis_db.delete(*dirty_cache_keys)
+
+
+@sqlevent.listens_for(sqlorm.Session, 'after_rollback')
+def clear_dirty_user_validation_cache(session: sqlorm.Session):
+    session.info.pop('dirty_refresh_token_cache_keys', None)
 
 
 class AdminToken(TokenBase):
@@ -278,9 +694,7 @@ class AdminToken(TokenBase):
         parsed_token = super().from_token(jwt_input, key, algorithm)
 
         # Check if token's revoked
-        redis_key = RedisKeyType.TOKEN_REVOKE.as_redis_key(parsed_token.jti)
-        redis_result = redis_db.get(redis_key)
-        if redis_result and redis_result == b'revoked':
+        if token_revocation_index.is_revoked(parsed_token.jti):
             raise jwt.exceptions.InvalidTokenError('This token was revoked')
 
         return parsed_token
@@ -326,6 +740,7 @@ def create_login_data(user_data: user_module.User,
 
     refresh_token = RefreshToken.from_usertable(user_data)
     refresh_token.user_agent = user_agent
+    refresh_token.user_agent_fingerprint = user_agent_fingerprint(user_agent)
     refresh_token.client_token = client_token
     refresh_token.ip_addr = ip_addr
     refresh_token_jwt = refresh_token.create_token(key, algorithm, True)
@@ -341,7 +756,7 @@ def create_login_data(user_data: user_module.User,
     response_data['refresh_token'] = {'exp': refresh_token.exp, }
 
     access_token = AccessToken.from_refresh_token(refresh_token)
-    access_token_jwt = access_token.create_token(key+csrf_token, algorithm, True)
+    access_token_jwt = access_token.create_token(key, algorithm, True, csrf_token=csrf_token)
     response_data['access_token'] = {
         'exp': refresh_token.exp,
         'token': access_token_jwt,
@@ -365,7 +780,7 @@ def create_login_data(user_data: user_module.User,
     return response_header, response_data
 
 
-def refresh_login_data(refresh_token_jwt: str,
+def refresh_login_data(refresh_token: typing.Union[str, RefreshToken],
                        user_agent: str, csrf_token: str, client_token: typing.Optional[str],
                        ip_addr: str, key: str, algorithm: str = 'HS256')\
                             -> tuple[list[tuple[str, str]], dict[str, str]]:
@@ -377,24 +792,19 @@ def refresh_login_data(refresh_token_jwt: str,
     response_header: list[tuple[str, str]] = list()
     response_data: dict[str, dict[str, str]] = dict()
 
-    refresh_token = RefreshToken.from_token(refresh_token_jwt, key)
+    # Caller can pass already verified refresh token to skip verifying it again.
+    if isinstance(refresh_token, str):
+        refresh_token = RefreshToken.from_token(refresh_token, key)
 
     # Check device type/OS/browser using User-Agent.
     # We'll refresh token only if it's same with db records
     try:
-        db_ua: ua_parser.UserAgent = ua.parse(refresh_token.user_agent)
-        req_ua: ua_parser.UserAgent = ua.parse(user_agent)
-
-        check_result: bool = all((
-            any((
-                db_ua.is_mobile == req_ua.is_mobile,
-                db_ua.is_tablet == req_ua.is_tablet,
-                db_ua.is_pc == req_ua.is_pc,
-            )),
-            db_ua.os.family == req_ua.os.family,
-            db_ua.browser.family == req_ua.browser.family,
-        ))
-        if not check_result:
+        # Tokens issued before fingerprint column was added don't have fingerprints.
+        db_ua_fingerprint: str = refresh_token.user_agent_fingerprint\
+            or user_agent_fingerprint(refresh_token.user_agent)
+        req_ua_fingerprint: str = user_agent_fingerprint(user_agent)
+
+        if not is_user_agent_compatible(db_ua_fingerprint, req_ua_fingerprint):
             raise jwt.exceptions.InvalidTokenError('User-Agent does not compatable')
     except jwt.exceptions.InvalidTokenError:
         raise
@@ -404,9 +814,12 @@ def refresh_login_data(refresh_token_jwt: str,
     # Refresh token will be re-issued only when there's 10 days left until token expires
     token_exp_time = refresh_token.exp.replace(tzinfo=utils.UTC)
     if token_exp_time < datetime.datetime.utcnow().replace(tzinfo=utils.UTC) + datetime.timedelta(days=10):
+        # Token from validation cache must be loaded from DB to be modified.
+        refresh_token = refresh_token.to_persistent()
         try:
             # Re-issue refresh token
             refresh_token.user_agent = user_agent
+            refresh_token.user_agent_fingerprint = req_ua_fingerprint
             refresh_token.ip_addr = ip_addr
             refresh_token_jwt = refresh_token.create_token(key, algorithm, True)
             db.session.commit()
@@ -430,13 +843,14 @@ def refresh_login_data(refresh_token_jwt: str,
 
     # If client requests token change, then we need to commit this on db
     elif refresh_token.client_token != client_token:
+        refresh_token = refresh_token.to_persistent()
         refresh_token.client_token = client_token
         db.session.commit()
 
     # Now, re-issue Access token
     # Access token can always be re-issued
     access_token = AccessToken.from_refresh_token(refresh_token)
-    access_token_jwt = access_token.create_token(key+csrf_token, algorithm, True)
+    access_token_jwt = access_token.create_token(key, algorithm, True, csrf_token=csrf_token)
     response_data['access_token'] = {
         'exp': access_token.exp,
         'token': access_token_jwt,
@@ -3,6 +3,23 @@ import docker.client
 import flask
 
 docker_client: docker.client.DockerClient = None
+# Every container created by this backend has this label, so that containers not created by us are never touched.
+managed_label: str = 'dodoco.managed'
+
+# Images that users can create containers with, and container ports to expose.
+# restrict docker image to ubuntu, cuz this is just a prototype
+docker_image_whitelist: dict[str, dict] = {
+    'ubuntu': {
+        'ports': [
+            '22/all',  # ssh
+        ],
+    },
+    # 'alpine',
+    # 'debian',
+    # 'centos',
+    # 'fedora',
+    # 'amazonlinux',
+}
 
 
 def init_app(app: flask.Flask):
@@ -14,4 +31,14 @@ def init_app(app: flask.Flask):
     else:
         docker_client = docker.from_env()
 
-    # TODO: Check container records on db are available on real machine
+    import app.plugin.ddc_docker.port_allocator as port_allocator  # noqa
+    import app.plugin.ddc_docker.provisioner as provisioner  # noqa
+    import app.plugin.ddc_docker.warm_pool as warm_pool  # noqa
+    import app.plugin.ddc_docker.reconciler as reconciler  # noqa
+    import app.plugin.ddc_docker.status_watcher as status_watcher  # noqa
+    port_allocator.init_app(app)
+    provisioner.init_app(app)
+    warm_pool.init_app(app)
+    # Container records on DB are checked against the real machine periodically
+    reconciler.init_app(app)
+    status_watcher.init_app(app)
@@ -0,0 +1,182 @@
+import flask
+import socket
+import time
+import typing
+
+import app.database as db_module
+import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.redis_lock as ddc_redis_lock
+
+db = db_module.db
+redis_db = db_module.redis_db
+RedisKeyType = db_module.RedisKeyType
+
+# Exposed ports are allocated on a Redis bitmap of the port range, bit N is set if (range start + N) is in use.
+# Allocated ports are also recorded as leases with allocated time, so that ports which are not stored on DB yet
+# (or in warm pools) survive rebuild() for lease_timeout seconds.
+port_bitmap_key: str = RedisKeyType.CONTAINER_PORT_BITMAP.value
+port_cursor_key: str = RedisKeyType.CONTAINER_PORT_CURSOR.value
+port_lease_key: str = RedisKeyType.CONTAINER_PORT_LEASE.value
+rebuild_lock_key: str = RedisKeyType.CONTAINER_PORT_REBUILD_LOCK.value
+lease_timeout: int = 10 * 60
+
+port_range_start: int = 24000
+port_range_end: int = 34000  # exclusive
+
+# Each entry is a tuple of (container port, protocol, exposed port)
+PortDefType = tuple[int, str, int]
+
+# KEYS[1]: bitmap, KEYS[2]: next-fit cursor, KEYS[3]: lease sorted set
+# ARGV[1]: size of port range, ARGV[2]: current timestamp
+# Returns offset of allocated port, or -1 if all ports are in use.
+port_allocate_script = redis_db.register_script('''
+local range_size = tonumber(ARGV[1])
+local cursor = tonumber(redis.call('GET', KEYS[2]) or '0')
+if cursor >= range_size then
+    cursor = 0
+end
+
+local offset = redis.call('BITPOS', KEYS[1], 0, math.floor(cursor / 8))
+if offset == -1 or offset >= range_size then
+    offset = redis.call('BITPOS', KEYS[1], 0)
+end
+if offset == -1 or offset >= range_size then
+    return -1
+end
+
+redis.call('SETBIT', KEYS[1], offset, 1)
+redis.call('SET', KEYS[2], offset + 1)
+redis.call('ZADD', KEYS[3], ARGV[2], offset)
+return offset
+''')
+# KEYS[1]: bitmap, KEYS[2]: lease sorted set
+# ARGV[1]: new bitmap bytes, ARGV[2]: leases older than this timestamp are expired
+port_rebuild_script = redis_db.register_script('''
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[2])
+for _, offset in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+    redis.call('SETBIT', KEYS[1], tonumber(offset), 1)
+end
+return 1
+''')
+
+
+class PortExhaustedException(Exception):
+    pass
+
+
+def is_port_bindable(port: int) -> bool:
+    # Port may be used by processes other than Docker containers.
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('', port))
+            return True
+        except OSError:
+            return False
+
+
+def rebuild():
+    '''
+    Rebuild port bitmap from exposed ports on DB and warm pools, and the ports leased recently.
+    This also returns ports leaked by failed container creations.
+    '''
+    import app.database.dodoco.container as ddc_db_container  # noqa
+    import app.plugin.ddc_docker.warm_pool as ddc_warm_pool  # noqa
+
+    # Ports committed on DB after this query are still on leases, which are applied with the bitmap atomically.
+    used_ports: set[int] = {
+        row[0] for row in db.session.query(ddc_db_container.ContainerPort.exposed_port).distinct().all()}
+    used_ports.update(ddc_warm_pool.get_pooled_ports())
+
+    port_bitmap = bytearray((port_range_end - port_range_start + 7) // 8)
+    for port in used_ports:
+        if port_range_start <= port < port_range_end:
+            offset = port - port_range_start
+            port_bitmap[offset // 8] |= 0x80 >> (offset % 8)  # Redis bitmap is big-endian in each byte
+
+    port_rebuild_script(
+        keys=[port_bitmap_key, port_lease_key],
+        args=[bytes(port_bitmap), int(time.time()) - lease_timeout])
+
+
+def ensure_bitmap():
+    if redis_db.exists(port_bitmap_key):
+        return
+
+    lock_token = ddc_redis_lock.acquire(rebuild_lock_key, 60)
+    if lock_token:
+        try:
+            if not redis_db.exists(port_bitmap_key):
+                rebuild()
+        finally:
+            ddc_redis_lock.release(rebuild_lock_key, lock_token)
+    else:
+        # Other process is building the bitmap
+        for _ in range(100):
+            if redis_db.exists(port_bitmap_key):
+                return
+            time.sleep(0.1)
+        raise PortExhaustedException('Port bitmap is not ready')
+
+
+def allocate(max_tries: int = 100) -> int:
+    '''Allocate an exposed port atomically. Allocated port is never returned again until release() or rebuild().'''
+    ensure_bitmap()
+    for _ in range(max_tries):
+        offset = port_allocate_script(
+            keys=[port_bitmap_key, port_cursor_key, port_lease_key],
+            args=[port_range_end - port_range_start, int(time.time())])
+        if offset < 0:
+            raise PortExhaustedException('All ports are in use')
+
+        port = port_range_start + offset
+        if is_port_bindable(port):
+            return port
+        # Port is used by other process, so keep it marked as used until next rebuild.
+
+    raise PortExhaustedException(f'No bindable ports found in {max_tries} tries')
+
+
+def lease(ports: typing.Iterable[int]):
+    '''Refresh leases of allocated ports, so that those are kept on rebuild() until stored on DB.'''
+    lease_data = {
+        port - port_range_start: int(time.time())
+        for port in ports if port_range_start <= port < port_range_end}
+    if lease_data:
+        redis_db.zadd(port_lease_key, lease_data)
+
+
+def release(ports: typing.Iterable[int]):
+    offsets = [port - port_range_start for port in set(ports) if port_range_start <= port < port_range_end]
+    if not offsets:
+        return
+
+    redis_pipeline = redis_db.pipeline()
+    for offset in offsets:
+        redis_pipeline.setbit(port_bitmap_key, offset, 0)
+    redis_pipeline.zrem(port_lease_key, *offsets)
+    redis_pipeline.execute()
+
+
+def allocate_image_ports(image_base_name: str) -> list[PortDefType]:
+    '''Allocate exposed ports for container ports of whitelisted image.'''
+    port_defs: list[PortDefType] = list()
+    try:
+        for port_info in ddc_plugin_docker.docker_image_whitelist[image_base_name]['ports']:
+            container_port_num, target_port_protocol = port_info.split('/')
+            exposed_port_num = allocate()
+            port_protocols = ('tcp', 'udp', ) if target_port_protocol == 'all' else (target_port_protocol, )
+
+            for port_protocol in port_protocols:
+                port_defs.append((int(container_port_num), port_protocol, exposed_port_num))
+    except Exception:
+        release(port_def[2] for port_def in port_defs)
+        raise
+    return port_defs
+
+
+def init_app(app: flask.Flask):
+    global port_range_start, port_range_end
+
+    port_range_start = app.config.get('CONTAINER_PORT_RANGE_START', port_range_start)
+    port_range_end = app.config.get('CONTAINER_PORT_RANGE_END', port_range_end)
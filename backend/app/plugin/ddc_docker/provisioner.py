@@ -0,0 +1,436 @@
+import concurrent.futures
+import docker
+import docker.errors
+import enum
+import flask
+import json
+import os
+import pathlib as pt
+import secrets
+import socket
+import threading
+import time
+import typing
+
+import app.common.utils as utils
+import app.database as db_module
+import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.port_allocator as ddc_port_allocator
+
+db = db_module.db
+redis_db = db_module.redis_db
+RedisKeyType = db_module.RedisKeyType
+
+# Provisioning job is a Redis hash, and job ids are queued on a Redis list.
+# Any process that runs ProvisionWorkerPool(API server with CONTAINER_PROVISION_WORKERS > 0,
+# or `flask container-provision-worker`) consumes the queue.
+provision_queue_key: str = RedisKeyType.CONTAINER_PROVISION_QUEUE.value
+# Teardown jobs are JSON objects of Docker container ids and exposed ports, and consumed by the same workers.
+teardown_queue_key: str = RedisKeyType.CONTAINER_TEARDOWN_QUEUE.value
+# Workers move popped jobs to their own processing list atomically, and remove those after the jobs are done.
+# Jobs left on processing lists of dead worker pools(heartbeat expired) are requeued, see requeue_stale_jobs().
+# LMOVE and BLMOVE require Redis 6.2 or later.
+worker_pool_key: str = RedisKeyType.CONTAINER_PROVISION_WORKER_POOL.value
+worker_heartbeat_interval: int = 10
+worker_heartbeat_ttl: int = 60
+# Jobs are removed after this seconds since last update.
+provision_job_ttl: int = 24 * 60 * 60
+setup_script_dir: pt.Path = pt.Path(__file__).parent / 'docker_setup_script'
+
+
+class ProvisionJobStatus(utils.EnumAutoName):
+    pending = enum.auto()
+    pulling = enum.auto()
+    creating = enum.auto()
+    starting = enum.auto()
+    ready = enum.auto()
+    failed = enum.auto()
+
+
+# Jobs on these statuses may still change its container record.
+active_job_statuses: tuple[str, ...] = (
+    ProvisionJobStatus.pending.value, ProvisionJobStatus.pulling.value,
+    ProvisionJobStatus.creating.value, ProvisionJobStatus.starting.value, )
+
+
+def get_job_key(job_id: str) -> str:
+    return RedisKeyType.CONTAINER_PROVISION_JOB.as_redis_key(job_id)
+
+
+def get_container_job_key(container_uuid: int) -> str:
+    return RedisKeyType.CONTAINER_PROVISION_CONTAINER_JOB.as_redis_key(container_uuid)
+
+
+def get_heartbeat_key(pool_id: str) -> str:
+    return RedisKeyType.CONTAINER_PROVISION_HEARTBEAT.as_redis_key(pool_id)
+
+
+def get_processing_key(pool_id: str, worker_num: int, queue_key: str) -> str:
+    return RedisKeyType.CONTAINER_PROVISION_PROCESSING.as_redis_key(f'{pool_id}/{worker_num}/{queue_key}')
+
+
+def set_job_status(job_id: str, status: ProvisionJobStatus, error: typing.Optional[str] = None):
+    job_data = {'status': status.value, 'updated_at': int(time.time()), }
+    if error is not None:
+        job_data['error'] = error
+
+    container_uuid = redis_db.hget(get_job_key(job_id), 'container_uuid')
+    redis_pipeline = redis_db.pipeline()
+    redis_pipeline.hset(get_job_key(job_id), mapping=job_data)
+    redis_pipeline.expire(get_job_key(job_id), provision_job_ttl)
+    if container_uuid is not None:
+        redis_pipeline.expire(get_container_job_key(int(container_uuid)), provision_job_ttl)
+    redis_pipeline.execute()
+
+
+def enqueue_job(container_uuid: int, user_id: int, image_name: str) -> str:
+    job_id = secrets.token_hex(16)
+    current_timestamp = int(time.time())
+    job_data = {
+        'status': ProvisionJobStatus.pending.value,
+        'container_uuid': container_uuid,
+        'user_id': user_id,
+        'image_name': image_name,
+        'created_at': current_timestamp,
+        'updated_at': current_timestamp,
+    }
+
+    redis_pipeline = redis_db.pipeline()
+    redis_pipeline.hset(get_job_key(job_id), mapping=job_data)
+    redis_pipeline.expire(get_job_key(job_id), provision_job_ttl)
+    redis_pipeline.set(get_container_job_key(container_uuid), job_id, ex=provision_job_ttl)
+    redis_pipeline.rpush(provision_queue_key, job_id)
+    redis_pipeline.execute()
+    return job_id
+
+
+def get_job(job_id: str) -> typing.Optional[dict[str, typing.Any]]:
+    job_data = redis_db.hgetall(get_job_key(job_id))
+    if not job_data:
+        return None
+
+    job_data = {k.decode(): v.decode() for k, v in job_data.items()}
+    return {
+        'resource': 'container_provision_job',
+        'job_id': job_id,
+        'status': job_data['status'],
+        'container_uuid': int(job_data['container_uuid']),
+        'user_id': int(job_data['user_id']),
+        'image_name': job_data['image_name'],
+        'error': job_data.get('error', None),
+        'created_at_int': int(job_data['created_at']),
+        'updated_at_int': int(job_data['updated_at']),
+    }
+
+
+def get_container_job_statuses(container_uuids: typing.Iterable[int]) -> dict[int, str]:
+    '''Returns status of the last provisioning job of each container, containers without jobs are omitted.'''
+    container_uuids = list(container_uuids)
+    redis_pipeline = redis_db.pipeline(transaction=False)
+    for container_uuid in container_uuids:
+        redis_pipeline.get(get_container_job_key(container_uuid))
+    container_job_ids: list[tuple[int, bytes]] = [
+        (container_uuid, job_id) for container_uuid, job_id in zip(container_uuids, redis_pipeline.execute())
+        if job_id is not None]
+
+    redis_pipeline = redis_db.pipeline(transaction=False)
+    for _, job_id in container_job_ids:
+        redis_pipeline.hget(get_job_key(job_id.decode()), 'status')
+
+    return {
+        container_uuid: job_status.decode()
+        for (container_uuid, _), job_status in zip(container_job_ids, redis_pipeline.execute())
+        if job_status is not None}
+
+
+def fail_job_of_container(container_uuid: int, error: str):
+    job_id = redis_db.get(get_container_job_key(container_uuid))
+    if job_id is None:
+        return
+
+    job_status = redis_db.hget(get_job_key(job_id.decode()), 'status')
+    if job_status is not None and job_status.decode() in active_job_statuses:
+        set_job_status(job_id.decode(), ProvisionJobStatus.failed, error=error)
+
+
+def pull_image_if_needed(image_name: str):
+    try:
+        ddc_plugin_docker.docker_client.images.get(image_name)
+    except docker.errors.ImageNotFound:
+        ddc_plugin_docker.docker_client.images.pull(image_name)
+
+
+def push_setup_script(target_container, image_base_name: str):
+    setup_script_file = setup_script_dir / f'{image_base_name}.sh'
+    if not setup_script_file.exists():
+        return
+
+    setup_script = setup_script_file.read_text().format(
+        TARGET_USERNAME='musoftware',
+        TARGET_PASSWORD='qwerty!0')
+    target_container.push_file_data({'setup.sh': setup_script, }, '/tmp/', mode=0o755)
+
+
+def run_job(job_id: str):
+    import app.database.dodoco.container as ddc_db_container  # noqa
+
+    job_data = get_job(job_id)
+    if not job_data:
+        # Job expired before it runs
+        return
+    if job_data['status'] not in active_job_statuses:
+        # Job is requeued after it's done, as its worker died before removing it from the processing list.
+        return
+
+    try:
+        target_container: ddc_db_container.Container = db.session.query(ddc_db_container.Container)\
+            .filter(ddc_db_container.Container.uuid == job_data['container_uuid'])\
+            .first()
+        if not target_container:
+            raise Exception('Container record was removed before provisioning')
+
+        # Job may be requeued after its Docker container is created and committed.
+        created_container = None
+        if job_data['status'] in (ProvisionJobStatus.creating.value, ProvisionJobStatus.starting.value)\
+                and target_container.container_id:
+            try:
+                created_container = target_container.get_container_obj()
+            except docker.errors.NotFound:
+                pass
+
+        if created_container is None:
+            set_job_status(job_id, ProvisionJobStatus.pulling)
+            pull_image_if_needed(job_data['image_name'])
+
+            set_job_status(job_id, ProvisionJobStatus.creating)
+            target_container.create(job_data['image_name'], db_commit=True)
+
+        set_job_status(job_id, ProvisionJobStatus.starting)
+        target_container.start()
+        try:
+            push_setup_script(target_container, job_data['image_name'].split(':')[0])
+        except Exception as err:
+            # Container is usable even if setup script is not pushed
+            print(utils.get_traceback_msg(err))
+
+        set_job_status(job_id, ProvisionJobStatus.ready)
+    except Exception as err:
+        db.session.rollback()
+        print(utils.get_traceback_msg(err))
+        set_job_status(job_id, ProvisionJobStatus.failed, error=str(err))
+
+
+def enqueue_teardown(container_ids: list[str], exposed_ports: typing.Optional[list[int]] = None):
+    '''
+    Schedule removal of Docker containers. Exposed ports are released after all containers are removed.
+    Call this after the container records are deleted and committed,
+    so that containers are never removed while their records are alive.
+    '''
+    container_ids = [container_id for container_id in container_ids if container_id]
+    if container_ids or exposed_ports:
+        redis_db.rpush(teardown_queue_key, json.dumps({
+            'container_ids': container_ids,
+            'exposed_ports': exposed_ports or [], }))
+
+
+def teardown_container(container_id: str, timeout: int):
+    try:
+        target_container = ddc_plugin_docker.docker_client.containers.get(container_id)
+        # Docker kills the container if it doesn't stop in timeout seconds.
+        target_container.stop(timeout=timeout)
+        target_container.remove(force=True)
+    except docker.errors.NotFound:
+        # Already removed
+        pass
+
+
+def teardown_containers(container_ids: list[str], timeout: int, max_workers: int) -> dict[str, str]:
+    '''Remove containers concurrently. Returns error messages of containers that couldn't be removed.'''
+    errors: dict[str, str] = dict()
+    if not container_ids:
+        return errors
+
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(container_ids)), thread_name_prefix='container-teardown')
+    teardown_futures = {
+        executor.submit(teardown_container, container_id, timeout): container_id
+        for container_id in container_ids}
+    try:
+        # Give some more time than the stop timeout for removing containers.
+        concurrent.futures.wait(
+            teardown_futures, timeout=timeout * ((len(container_ids) + max_workers - 1) // max_workers) + 30)
+    finally:
+        # Containers not taken by threads in time are left to the reconciler.
+        # Running ones are waited, as Docker calls can't be interrupted and those results must be reported.
+        for teardown_future in teardown_futures:
+            teardown_future.cancel()
+        executor.shutdown(wait=True)
+
+    for teardown_future, container_id in teardown_futures.items():
+        if teardown_future.cancelled():
+            errors[container_id] = 'Timed out before removal started'
+        elif teardown_future.exception() is not None:
+            errors[container_id] = str(teardown_future.exception())
+
+    return errors
+
+
+def run_teardown_job(teardown_data: dict[str, list]):
+    container_ids: list[str] = teardown_data['container_ids']
+    teardown_errors = teardown_containers(
+        container_ids,
+        timeout=flask.current_app.config.get('CONTAINER_TEARDOWN_TIMEOUT', 10),
+        max_workers=flask.current_app.config.get('CONTAINER_TEARDOWN_CONCURRENCY', 8))
+
+    print(f'Removed {len(container_ids) - len(teardown_errors)} of {len(container_ids)} containers')
+    for container_id, teardown_error in teardown_errors.items():
+        print(f'Failed to remove container {container_id}: {teardown_error}')
+
+    # Ports of containers that couldn't be removed may still be bound,
+    # so leave those to the port allocator's rebuild.
+    if not teardown_errors:
+        ddc_port_allocator.release(teardown_data['exposed_ports'])
+
+
+def requeue_stale_jobs() -> int:
+    '''
+    Move jobs on processing lists of dead worker pools back to the front of their queues.
+    Returns number of requeued jobs.
+    '''
+    requeued_count = 0
+    for pool_id, worker_count in redis_db.hgetall(worker_pool_key).items():
+        pool_id = pool_id.decode()
+        if redis_db.exists(get_heartbeat_key(pool_id)):
+            continue
+
+        for worker_num in range(int(worker_count)):
+            for queue_key in (provision_queue_key, teardown_queue_key):
+                # LMOVE is atomic, so a job is never requeued twice even if other pools are requeueing it.
+                while redis_db.lmove(get_processing_key(pool_id, worker_num, queue_key), queue_key, 'RIGHT', 'LEFT'):
+                    requeued_count += 1
+        redis_db.hdel(worker_pool_key, pool_id)
+
+    return requeued_count
+
+
+class ProvisionWorkerPool:
+    '''
+    Threads that pop provisioning and teardown jobs from the Redis queues and run those on the app context.
+    Docker calls mostly wait for the Docker daemon, so threads are enough here.
+    Another thread keeps the heartbeat of this pool, and requeues jobs of dead pools.
+    '''
+    def __init__(self, app: flask.Flask, worker_count: int, poll_timeout: int = 5):
+        self.app: flask.Flask = app
+        self.worker_count: int = worker_count
+        self.poll_timeout: int = poll_timeout
+        self.pool_id: str = f'{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(4)}'
+
+        self._threads: list[threading.Thread] = list()
+        self._stop_event: threading.Event = threading.Event()
+
+    def start(self):
+        self.beat()
+        redis_db.hset(worker_pool_key, self.pool_id, self.worker_count)
+        requeued_count = requeue_stale_jobs()
+        if requeued_count:
+            print(f'Requeued {requeued_count} jobs of dead container provisioning workers')
+
+        heartbeat_thread = threading.Thread(
+            target=self.heartbeat_loop, name='container-provisioner-heartbeat', daemon=True)
+        heartbeat_thread.start()
+        self._threads.append(heartbeat_thread)
+
+        for worker_num in range(self.worker_count):
+            worker_thread = threading.Thread(
+                target=self.worker_loop, args=(worker_num, ), name=f'container-provisioner-{worker_num}', daemon=True)
+            worker_thread.start()
+            self._threads.append(worker_thread)
+
+    def stop(self, timeout: typing.Optional[float] = None):
+        self._stop_event.set()
+        for worker_thread in self._threads:
+            worker_thread.join(timeout)
+
+        if not any(worker_thread.is_alive() for worker_thread in self._threads):
+            # Processing lists are empty, otherwise jobs on those are requeued after the heartbeat expires.
+            redis_db.hdel(worker_pool_key, self.pool_id)
+            redis_db.delete(get_heartbeat_key(self.pool_id))
+        self._threads.clear()
+
+    def join(self):
+        for worker_thread in self._threads:
+            worker_thread.join()
+
+    def beat(self):
+        redis_db.set(get_heartbeat_key(self.pool_id), int(time.time()), ex=worker_heartbeat_ttl)
+
+    def heartbeat_loop(self):
+        while not self._stop_event.wait(worker_heartbeat_interval):
+            try:
+                self.beat()
+                requeue_stale_jobs()
+            except Exception as err:
+                print(utils.get_traceback_msg(err))
+
+    def pop_job(self, worker_num: int) -> typing.Optional[tuple[str, str, bytes]]:
+        '''
+        Move a job to the processing list of the worker, and returns its queue key, processing list key and payload.
+        Teardown queue is checked first without blocking, so teardown jobs wait at most poll_timeout seconds.
+        '''
+        processing_key = get_processing_key(self.pool_id, worker_num, teardown_queue_key)
+        job_payload = redis_db.lmove(teardown_queue_key, processing_key, 'LEFT', 'RIGHT')
+        if job_payload is not None:
+            return teardown_queue_key, processing_key, job_payload
+
+        processing_key = get_processing_key(self.pool_id, worker_num, provision_queue_key)
+        job_payload = redis_db.blmove(provision_queue_key, processing_key, self.poll_timeout, 'LEFT', 'RIGHT')
+        if job_payload is not None:
+            return provision_queue_key, processing_key, job_payload
+        return None
+
+    def worker_loop(self, worker_num: int):
+        while not self._stop_event.is_set():
+            try:
+                popped_job = self.pop_job(worker_num)
+            except Exception as err:
+                print(utils.get_traceback_msg(err))
+                self._stop_event.wait(self.poll_timeout)
+                continue
+            if not popped_job:
+                continue
+
+            queue_key, processing_key, job_payload = popped_job
+            with self.app.app_context():
+                try:
+                    if queue_key == teardown_queue_key:
+                        run_teardown_job(json.loads(job_payload))
+                    else:
+                        run_job(job_payload.decode())
+                except Exception as err:
+                    print(utils.get_traceback_msg(err))
+                finally:
+                    db.session.remove()
+
+            try:
+                # Failed jobs are removed too, those would fail again on retries.
+                redis_db.lrem(processing_key, 1, job_payload)
+            except Exception as err:
+                print(utils.get_traceback_msg(err))
+
+
+worker_pool: typing.Optional[ProvisionWorkerPool] = None
+
+
+def init_app(app: flask.Flask):
+    worker_count = app.config.get('CONTAINER_PROVISION_WORKERS', 0)
+    if worker_count <= 0:
+        return
+
+    # Start workers only on the processes that serve requests,
+    # so that CLI commands like db migration don't pop the jobs and exit.
+    @app.before_first_request
+    def start_worker_pool():
+        global worker_pool
+        if worker_pool is None:
+            worker_pool = ProvisionWorkerPool(app, worker_count)
+            worker_pool.start()
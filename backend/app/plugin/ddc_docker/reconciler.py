@@ -0,0 +1,295 @@
+import dataclasses
+import datetime
+import flask
+import threading
+import time
+import typing
+
+import app.common.utils as utils
+import app.database as db_module
+import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.port_allocator as ddc_port_allocator
+import app.plugin.ddc_docker.provisioner as ddc_provisioner
+import app.plugin.ddc_docker.redis_lock as ddc_redis_lock
+import app.plugin.ddc_docker.status_watcher as ddc_status_watcher
+import app.plugin.ddc_docker.warm_pool as ddc_warm_pool
+
+db = db_module.db
+redis_db = db_module.redis_db
+RedisKeyType = db_module.RedisKeyType
+
+reconcile_lock_key: str = RedisKeyType.CONTAINER_RECONCILE_LOCK.value
+reconcile_metrics_key: str = RedisKeyType.CONTAINER_RECONCILE_METRICS.value
+# Docker container states that must be started again
+stopped_container_states: tuple[str, ...] = ('created', 'exited', )
+
+
+@dataclasses.dataclass
+class ReconcileResult:
+    docker_container_count: int = 0
+    db_container_count: int = 0
+    orphan_rows_deleted: int = 0
+    stale_rows_deleted: int = 0
+    orphan_containers_removed: int = 0
+    container_ids_fixed: int = 0
+    containers_started: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    finished_at: int = 0
+
+
+def reconcile(grace_period: int = 300, dry_run: bool = False) -> ReconcileResult:
+    '''
+    Compare container records with Docker containers on the machine, and fix drifts in bulk.
+    - Records whose Docker container is gone are deleted with their port records.
+    - Records without Docker container for longer than provisioning job TTL are deleted with their port records,
+      and their jobs are marked as failed. Provisioning workers of those died, or the jobs failed.
+    - Records whose Docker container is recreated with same name get the new container id.
+    - Stopped containers of records are started.
+    - Managed containers without records(and not in warm pools) are removed.
+    - Cached status of records is refreshed, in case that the status watcher missed some events.
+    - Port allocator is rebuilt, so that ports leaked by crashed processes are returned.
+    Containers created in grace_period seconds, and records modified in grace_period seconds or with active
+    provisioning jobs are not treated as orphans or stopped ones, because those may be in the middle of
+    provisioning or recreation.
+    '''
+    import app.database.dodoco.container as ddc_db_container  # noqa
+
+    start_time = time.monotonic()
+    result = ReconcileResult()
+    Container = ddc_db_container.Container
+    ContainerPort = ddc_db_container.ContainerPort
+
+    # Query records before listing Docker containers,
+    # records are committed after its Docker container is created, so those are always on the list.
+    # Warm containers claimed after this query are not matched with records,
+    # but those are still in pools or recorded as claimed when pools are read below.
+    container_rows = db.session.query(
+            Container.uuid, Container.container_id, Container.container_name, Container.modified_at)\
+        .filter(Container.container_id.isnot(None))\
+        .all()
+    result.db_container_count = len(container_rows)
+
+    stale_row_deadline = datetime.datetime.utcnow() - datetime.timedelta(seconds=ddc_provisioner.provision_job_ttl)
+    stale_row_uuids: list[int] = [
+        row[0] for row in db.session.query(Container.uuid)
+                                    .filter(Container.container_id.is_(None))
+                                    .filter(Container.created_at < stale_row_deadline)
+                                    .all()]
+
+    # One API call for all containers, sparse=True prevents inspecting each container.
+    docker_containers = {
+        docker_container.id: docker_container
+        for docker_container in ddc_plugin_docker.docker_client.containers.list(all=True, sparse=True)}
+    docker_container_names: dict[str, str] = {
+        container_name.lstrip('/'): docker_container.id
+        for docker_container in docker_containers.values()
+        for container_name in docker_container.attrs.get('Names', None) or ()}
+    result.docker_container_count = len(docker_containers)
+
+    grace_deadline = time.time() - grace_period
+    orphan_row_candidates: list[int] = list()
+    container_id_fixes: dict[int, str] = dict()
+    matched_container_ids: set[str] = set()
+    for container_row in container_rows:
+        docker_container_id = container_row.container_id
+        if docker_container_id not in docker_containers:
+            docker_container_id = docker_container_names.get(container_row.container_name, None)
+            if docker_container_id is None:
+                # Container.recreate() and provisioning after warm container fallback replace Docker container
+                # before committing the new id.
+                modified_at = container_row.modified_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+                if modified_at < grace_deadline:
+                    orphan_row_candidates.append(container_row.uuid)
+                continue
+            container_id_fixes[container_row.uuid] = docker_container_id
+
+        matched_container_ids.add(docker_container_id)
+
+    orphan_row_job_statuses = ddc_provisioner.get_container_job_statuses(orphan_row_candidates)
+    orphan_row_uuids: list[int] = [
+        container_uuid for container_uuid in orphan_row_candidates
+        if orphan_row_job_statuses.get(container_uuid, None) not in ddc_provisioner.active_job_statuses]
+
+    stopped_containers = [
+        docker_containers[docker_container_id] for docker_container_id in matched_container_ids
+        if docker_containers[docker_container_id].attrs.get('State', None) in stopped_container_states
+        and docker_containers[docker_container_id].attrs.get('Created', 0) < grace_deadline]
+
+    # Created time of warm containers is the time of warm pool replenishing, not the time of claim.
+    # Grace period only protects those between creation and pushing to pool, so claimed ones must be skipped.
+    warm_container_ids = ddc_warm_pool.get_pooled_container_ids() | ddc_warm_pool.get_claimed_container_ids()
+    orphan_container_ids = [
+        docker_container.id for docker_container in docker_containers.values()
+        if docker_container.id not in matched_container_ids
+        and docker_container.id not in warm_container_ids
+        and (docker_container.attrs.get('Labels', None) or {}).get(ddc_plugin_docker.managed_label, None)
+        and docker_container.attrs.get('Created', 0) < grace_deadline]
+
+    result.orphan_rows_deleted = len(orphan_row_uuids)
+    result.stale_rows_deleted = len(stale_row_uuids)
+    result.container_ids_fixed = len(container_id_fixes)
+    result.containers_started = len(stopped_containers)
+    result.orphan_containers_removed = len(orphan_container_ids)
+    if dry_run:
+        result.duration = time.monotonic() - start_time
+        return result
+
+    deleted_row_uuids: list[int] = orphan_row_uuids + stale_row_uuids
+    deleted_row_ports: list[int] = list()
+    try:
+        if deleted_row_uuids:
+            deleted_row_ports = [
+                row[0] for row in db.session.query(ContainerPort.exposed_port)
+                                            .filter(ContainerPort.container_id.in_(deleted_row_uuids))
+                                            .all()]
+            db.session.query(ContainerPort)\
+                .filter(ContainerPort.container_id.in_(deleted_row_uuids))\
+                .delete(synchronize_session=False)
+            db.session.query(Container)\
+                .filter(Container.uuid.in_(deleted_row_uuids))\
+                .delete(synchronize_session=False)
+        if container_id_fixes:
+            db.session.bulk_update_mappings(Container, [
+                {'uuid': container_uuid, 'container_id': docker_container_id}
+                for container_uuid, docker_container_id in container_id_fixes.items()])
+        db.session.commit()
+        # Docker containers of deleted rows are already gone or never created, so those ports are not bound.
+        ddc_port_allocator.release(deleted_row_ports)
+        for container_uuid in stale_row_uuids:
+            ddc_provisioner.fail_job_of_container(container_uuid, 'Provisioning timed out')
+    except Exception as err:
+        db.session.rollback()
+        print(utils.get_traceback_msg(err))
+        result.errors += 1
+        result.orphan_rows_deleted = result.stale_rows_deleted = result.container_ids_fixed = 0
+
+    for stopped_container in stopped_containers:
+        try:
+            stopped_container.start()
+        except Exception as err:
+            print(utils.get_traceback_msg(err))
+            result.errors += 1
+            result.containers_started -= 1
+
+    try:
+        ddc_status_watcher.update_statuses(ddc_status_watcher.get_listed_statuses(
+            docker_containers[docker_container_id] for docker_container_id in matched_container_ids
+            if docker_containers[docker_container_id] not in stopped_containers))
+    except Exception as err:
+        print(utils.get_traceback_msg(err))
+        result.errors += 1
+
+    # Removal may take a while, so this is done by provisioning workers
+    ddc_provisioner.enqueue_teardown(orphan_container_ids)
+
+    try:
+        ddc_port_allocator.rebuild()
+    except Exception as err:
+        print(utils.get_traceback_msg(err))
+        result.errors += 1
+
+    result.duration = time.monotonic() - start_time
+    result.finished_at = int(time.time())
+    return result
+
+
+def record_metrics(result: ReconcileResult):
+    '''Store metrics of the last run, and counters accumulated since Redis DB was flushed.'''
+    result_data = dataclasses.asdict(result)
+    redis_pipeline = redis_db.pipeline()
+    redis_pipeline.hset(reconcile_metrics_key, mapping={f'last_{k}': v for k, v in result_data.items()})
+    redis_pipeline.hincrby(reconcile_metrics_key, 'total_runs', 1)
+    for metric_name in ('orphan_rows_deleted', 'stale_rows_deleted', 'orphan_containers_removed',
+                        'container_ids_fixed', 'containers_started', 'errors'):
+        redis_pipeline.hincrby(reconcile_metrics_key, f'total_{metric_name}', result_data[metric_name])
+    redis_pipeline.execute()
+
+
+def get_metrics() -> dict[str, typing.Union[int, float]]:
+    metrics: dict[str, typing.Union[int, float]] = dict()
+    for metric_name, metric_value in redis_db.hgetall(reconcile_metrics_key).items():
+        try:
+            metrics[metric_name.decode()] = int(metric_value)
+        except ValueError:
+            metrics[metric_name.decode()] = float(metric_value)
+    return metrics
+
+
+def renew_lock_loop(lock_token: str, lock_timeout: int, stop_event: threading.Event):
+    while not stop_event.wait(lock_timeout / 3):
+        try:
+            if not ddc_redis_lock.renew(reconcile_lock_key, lock_token, lock_timeout):
+                print('Reconcile lock was lost while reconciling')
+                return
+        except Exception as err:
+            print(utils.get_traceback_msg(err))
+
+
+def run_reconcile(grace_period: int, lock_timeout: int) -> typing.Optional[ReconcileResult]:
+    # Only one process reconciles at a time. Returns None if other process is reconciling.
+    lock_token = ddc_redis_lock.acquire(reconcile_lock_key, lock_timeout)
+    if not lock_token:
+        return None
+
+    # Docker calls may take longer than lock_timeout, so the lock is renewed until reconciling ends.
+    renew_stop_event = threading.Event()
+    renew_thread = threading.Thread(
+        target=renew_lock_loop, args=(lock_token, lock_timeout, renew_stop_event),
+        name='container-reconcile-lock', daemon=True)
+    renew_thread.start()
+    try:
+        result = reconcile(grace_period)
+        record_metrics(result)
+        return result
+    finally:
+        renew_stop_event.set()
+        renew_thread.join()
+        ddc_redis_lock.release(reconcile_lock_key, lock_token)
+
+
+class ContainerReconciler:
+    '''Thread that reconciles containers on every interval seconds.'''
+    def __init__(self, app: flask.Flask, interval: float, grace_period: int):
+        self.app: flask.Flask = app
+        self.interval: float = interval
+        self.grace_period: int = grace_period
+
+        self._thread: typing.Optional[threading.Thread] = None
+        self._stop_event: threading.Event = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.reconcile_loop, name='container-reconciler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: typing.Optional[float] = None):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def reconcile_loop(self):
+        while not self._stop_event.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    run_reconcile(self.grace_period, lock_timeout=max(int(self.interval), 60))
+                except Exception as err:
+                    print(utils.get_traceback_msg(err))
+                finally:
+                    db.session.remove()
+
+
+reconciler: typing.Optional[ContainerReconciler] = None
+
+
+def init_app(app: flask.Flask):
+    interval = app.config.get('CONTAINER_RECONCILE_INTERVAL', 0)
+    if interval <= 0:
+        return
+
+    @app.before_first_request
+    def start_reconciler():
+        global reconciler
+        if reconciler is None:
+            reconciler = ContainerReconciler(app, interval, app.config.get('CONTAINER_RECONCILE_GRACE_PERIOD', 300))
+            reconciler.start()
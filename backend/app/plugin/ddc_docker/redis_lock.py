@@ -0,0 +1,42 @@
+import secrets
+import typing
+
+import app.database as db_module
+
+redis_db = db_module.redis_db
+
+# Locks of background components. Each lock holds a random token of its owner,
+# and is renewed or released only if the token matches, as the lock may be expired and taken by other process.
+# Comparing and changing the lock must be atomic, so those are done on Lua scripts.
+
+# KEYS[1]: lock key, ARGV[1]: lock token, ARGV[2]: lock timeout in seconds
+lock_renew_script = redis_db.register_script('''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+''')
+# KEYS[1]: lock key, ARGV[1]: lock token
+lock_release_script = redis_db.register_script('''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+''')
+
+
+def acquire(lock_key: str, lock_timeout: int, lock_token: typing.Optional[str] = None) -> typing.Optional[str]:
+    '''Returns the token of acquired lock, or None if other process is holding the lock.'''
+    lock_token = lock_token or secrets.token_hex(8)
+    if redis_db.set(lock_key, lock_token, nx=True, ex=lock_timeout):
+        return lock_token
+    return None
+
+
+def renew(lock_key: str, lock_token: str, lock_timeout: int) -> bool:
+    '''Returns False if the lock is not held by lock_token anymore.'''
+    return bool(lock_renew_script(keys=[lock_key], args=[lock_token, lock_timeout]))
+
+
+def release(lock_key: str, lock_token: str) -> bool:
+    return bool(lock_release_script(keys=[lock_key], args=[lock_token]))
@@ -0,0 +1,207 @@
+import datetime
+import flask
+import queue
+import secrets
+import sqlalchemy as sql
+import threading
+import time
+import typing
+
+import app.common.utils as utils
+import app.database as db_module
+import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.redis_lock as ddc_redis_lock
+
+db = db_module.db
+redis_db = db_module.redis_db
+RedisKeyType = db_module.RedisKeyType
+
+# Only one process subscribes Docker events at a time, lock is renewed on every flush.
+watcher_lock_key: str = RedisKeyType.CONTAINER_STATUS_WATCHER_LOCK.value
+watcher_lock_timeout: int = 30
+# Docker container event action -> Container.status
+event_status_map: dict[str, str] = {
+    'create': 'created',
+    'start': 'running',
+    'restart': 'running',
+    'unpause': 'running',
+    'pause': 'paused',
+    'die': 'exited',
+    'stop': 'exited',
+    'destroy': 'removed',
+}
+
+# Docker container id -> (status, status changed time)
+ContainerStatusType = dict[str, tuple[str, datetime.datetime]]
+
+
+def update_statuses(container_statuses: ContainerStatusType):
+    '''Update status of container records by Docker container id, with one executemany query.'''
+    import app.database.dodoco.container as ddc_db_container  # noqa
+
+    if not container_statuses:
+        return
+
+    container_table: sql.Table = ddc_db_container.Container.__table__
+    # Records that already have same status are not touched, so status_changed_at is kept.
+    # Status is not a user modification, so modified_at and commit_id must not be changed by onupdate.
+    update_stmt = sql.update(container_table)\
+        .where(container_table.c.container_id == sql.bindparam('b_container_id'))\
+        .where(sql.or_(
+            container_table.c.status.is_(None),
+            container_table.c.status != sql.bindparam('b_status')))\
+        .values(
+            status=sql.bindparam('b_status'),
+            status_changed_at=sql.bindparam('b_status_changed_at'),
+            modified_at=container_table.c.modified_at,
+            commit_id=container_table.c.commit_id)
+
+    try:
+        db.session.execute(update_stmt, [
+            {'b_container_id': container_id, 'b_status': status, 'b_status_changed_at': status_changed_at}
+            for container_id, (status, status_changed_at) in container_statuses.items()])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def get_listed_statuses(docker_containers: typing.Iterable) -> ContainerStatusType:
+    # Exact changed time is not on the list, so the time of listing is used.
+    current_time = datetime.datetime.utcnow().replace(tzinfo=utils.UTC)
+    return {
+        docker_container.id: (docker_container.attrs['State'], current_time)
+        for docker_container in docker_containers
+        if docker_container.attrs.get('State', None)}
+
+
+def resync():
+    '''Update status of all container records from a full listing of Docker containers.'''
+    update_statuses(get_listed_statuses(ddc_plugin_docker.docker_client.containers.list(all=True, sparse=True)))
+
+
+class ContainerStatusWatcher:
+    '''
+    Subscribes Docker container events, and writes status changes to DB in batches.
+    Reader thread pushes events to a queue, and writer thread flushes it on every flush_interval seconds.
+    '''
+    def __init__(self, app: flask.Flask, flush_interval: float, batch_size: int = 500):
+        self.app: flask.Flask = app
+        self.flush_interval: float = flush_interval
+        self.batch_size: int = batch_size
+
+        self._lock_token: str = secrets.token_hex(8)
+        self._is_leader: bool = False
+        self._event_stream = None
+        self._status_queue: queue.Queue[tuple[str, str, datetime.datetime]] = queue.Queue()
+        self._threads: list[threading.Thread] = list()
+        self._stop_event: threading.Event = threading.Event()
+
+    def start(self):
+        for thread_target, thread_name in ((self.reader_loop, 'container-status-reader'),
+                                           (self.writer_loop, 'container-status-writer')):
+            watcher_thread = threading.Thread(target=thread_target, name=thread_name, daemon=True)
+            watcher_thread.start()
+            self._threads.append(watcher_thread)
+
+    def stop(self, timeout: typing.Optional[float] = None):
+        self._stop_event.set()
+        self.close_event_stream()
+        for watcher_thread in self._threads:
+            watcher_thread.join(timeout)
+        self._threads.clear()
+
+    def close_event_stream(self):
+        event_stream, self._event_stream = self._event_stream, None
+        if event_stream is not None:
+            try:
+                event_stream.close()
+            except Exception:
+                pass
+
+    def acquire_lock(self) -> bool:
+        # Renew the lock if this watcher is holding it, checking the token and renewing are done atomically.
+        if ddc_redis_lock.renew(watcher_lock_key, self._lock_token, watcher_lock_timeout):
+            return True
+        return ddc_redis_lock.acquire(watcher_lock_key, watcher_lock_timeout, lock_token=self._lock_token) is not None
+
+    def reader_loop(self):
+        while not self._stop_event.is_set():
+            self._is_leader = self.acquire_lock()
+            if not self._is_leader:
+                self._stop_event.wait(watcher_lock_timeout / 2)
+                continue
+
+            try:
+                # Subscribe events from before the full listing, so that no change is missed between those.
+                events_since = int(time.time())
+                with self.app.app_context():
+                    try:
+                        resync()
+                    finally:
+                        db.session.remove()
+
+                self._event_stream = ddc_plugin_docker.docker_client.events(
+                    decode=True, since=events_since, filters={'type': 'container', })
+                for event in self._event_stream:
+                    container_status = event_status_map.get(event.get('Action', event.get('status', None)), None)
+                    if container_status is None:
+                        continue
+
+                    event_time = event.get('timeNano', None)
+                    event_time = event_time / 1e9 if event_time else event.get('time', time.time())
+                    self._status_queue.put((
+                        event['id'],
+                        container_status,
+                        datetime.datetime.fromtimestamp(event_time, tz=utils.UTC)))
+            except Exception as err:
+                if not self._stop_event.is_set() and self._is_leader:
+                    print(utils.get_traceback_msg(err))
+                    self._stop_event.wait(5)
+            finally:
+                self.close_event_stream()
+
+            # Event stream ends when Docker daemon restarts, give it some time before subscribing again.
+            self._stop_event.wait(1)
+
+    def writer_loop(self):
+        while not self._stop_event.is_set():
+            container_statuses: ContainerStatusType = dict()
+            flush_deadline = time.monotonic() + self.flush_interval
+            while len(container_statuses) < self.batch_size:
+                try:
+                    container_id, container_status, status_changed_at = self._status_queue.get(
+                        timeout=max(flush_deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                # Events are in order, so only the last status of each container needs to be written.
+                container_statuses[container_id] = (container_status, status_changed_at)
+
+            if container_statuses:
+                with self.app.app_context():
+                    try:
+                        update_statuses(container_statuses)
+                    except Exception as err:
+                        print(utils.get_traceback_msg(err))
+                    finally:
+                        db.session.remove()
+
+            if self._is_leader and not self.acquire_lock():
+                # Other process took the lock, stop subscribing and let the reader wait for the lock again.
+                self._is_leader = False
+                self.close_event_stream()
+
+
+watcher: typing.Optional[ContainerStatusWatcher] = None
+
+
+def init_app(app: flask.Flask):
+    if not app.config.get('CONTAINER_STATUS_WATCH_ENABLE', False):
+        return
+
+    @app.before_first_request
+    def start_watcher():
+        global watcher
+        if watcher is None:
+            watcher = ContainerStatusWatcher(app, app.config.get('CONTAINER_STATUS_FLUSH_INTERVAL', 1.0))
+            watcher.start()
@@ -0,0 +1,221 @@
+import docker.errors
+import flask
+import json
+import secrets
+import threading
+import time
+import typing
+
+import app.common.utils as utils
+import app.database as db_module
+import app.plugin.ddc_docker as ddc_plugin_docker
+import app.plugin.ddc_docker.port_allocator as ddc_port_allocator
+import app.plugin.ddc_docker.provisioner as ddc_provisioner
+import app.plugin.ddc_docker.redis_lock as ddc_redis_lock
+
+redis_db = db_module.redis_db
+RedisKeyType = db_module.RedisKeyType
+
+# Stopped containers of whitelisted images are created in advance, and claimed on container creation.
+# Docker cannot change port bindings of existing containers, so exposed ports are allocated on warm container creation.
+# Port allocator keeps ports of pooled containers on rebuild, see get_pooled_ports().
+warm_pool_label: str = 'dodoco.warm_pool'
+replenish_lock_key: str = RedisKeyType.CONTAINER_WARM_POOL_LOCK.value
+replenish_lock_timeout: int = 10 * 60
+# Claimed containers are recorded for this seconds, because those are neither in pools nor on DB
+# until the records are committed, and the reconciler must not remove those as orphans.
+claimed_key: str = RedisKeyType.CONTAINER_WARM_POOL_CLAIMED.value
+claimed_container_ttl: int = 10 * 60
+
+# KEYS[1]: pool list, KEYS[2]: claimed sorted set
+# ARGV[1]: current timestamp
+# Pops a pool entry and records its container id as claimed atomically. Returns the entry, or nil if pool is empty.
+claim_script = redis_db.register_script('''
+local pool_entry = redis.call('LPOP', KEYS[1])
+if pool_entry then
+    redis.call('ZADD', KEYS[2], ARGV[1], cjson.decode(pool_entry)['container_id'])
+end
+return pool_entry
+''')
+
+PortDefType = ddc_port_allocator.PortDefType
+
+
+def get_pool_key(image_name: str) -> str:
+    return RedisKeyType.CONTAINER_WARM_POOL.as_redis_key(image_name)
+
+
+def get_pool_image_names() -> list[str]:
+    return [f'{image_base_name}:latest' for image_base_name in ddc_plugin_docker.docker_image_whitelist]
+
+
+def get_pool_entries() -> list[dict[str, typing.Any]]:
+    redis_pipeline = redis_db.pipeline(transaction=False)
+    for image_name in get_pool_image_names():
+        redis_pipeline.lrange(get_pool_key(image_name), 0, -1)
+    return [json.loads(pool_entry) for pool in redis_pipeline.execute() for pool_entry in pool]
+
+
+def get_pooled_container_ids() -> set[str]:
+    return {pool_entry['container_id'] for pool_entry in get_pool_entries()}
+
+
+def get_claimed_container_ids() -> set[str]:
+    redis_db.zremrangebyscore(claimed_key, '-inf', f'({int(time.time()) - claimed_container_ttl}')
+    return {container_id.decode() for container_id in redis_db.zrange(claimed_key, 0, -1)}
+
+
+def get_pooled_ports() -> set[int]:
+    return {port_def[2] for pool_entry in get_pool_entries() for port_def in pool_entry['ports']}
+
+
+def create_warm_container(image_name: str):
+    port_defs = ddc_port_allocator.allocate_image_ports(image_name.split(':')[0])
+
+    try:
+        ddc_provisioner.pull_image_if_needed(image_name)
+        warm_container = ddc_plugin_docker.docker_client.containers.create(
+            image_name,
+            name=f'warm_{image_name.split(":")[0]}_{secrets.token_hex(16)}',
+            detach=True, stdin_open=True, tty=True,  # -dit
+            network_mode='bridge',
+            ports={f'{port_def[0]}/{port_def[1]}': port_def[2] for port_def in port_defs},
+            labels={ddc_plugin_docker.managed_label: 'true', warm_pool_label: image_name, })
+    except Exception:
+        ddc_port_allocator.release(port_def[2] for port_def in port_defs)
+        raise
+
+    redis_db.rpush(get_pool_key(image_name), json.dumps({
+        'container_id': warm_container.id,
+        'ports': port_defs,
+    }))
+
+
+def claim(image_name: str) -> typing.Optional[dict[str, typing.Any]]:
+    '''
+    Pop a warm container of image_name from the pool, or None if the pool is empty.
+    Ports of the popped container are leased again, so store those on DB before the lease expires.
+    '''
+    pool_key = get_pool_key(image_name)
+    while True:
+        # LPOP is atomic, so a warm container is never claimed twice.
+        # It's recorded as claimed on the same script, so the reconciler always finds it in pools or claimed ones.
+        pool_entry = claim_script(keys=[pool_key, claimed_key], args=[int(time.time())])
+        if pool_entry is None:
+            return None
+
+        pool_entry = json.loads(pool_entry)
+        pool_entry['ports'] = [tuple(port_def) for port_def in pool_entry['ports']]
+        try:
+            ddc_plugin_docker.docker_client.containers.get(pool_entry['container_id'])
+        except docker.errors.NotFound:
+            # Warm container was removed outside of the pool
+            ddc_port_allocator.release(port_def[2] for port_def in pool_entry['ports'])
+            continue
+
+        ddc_port_allocator.lease(port_def[2] for port_def in pool_entry['ports'])
+        request_replenish()
+        return pool_entry
+
+
+def activate_claimed_container(target_container):
+    '''Rename claimed warm container to the name of target_container record, and start it.'''
+    claimed_container = ddc_plugin_docker.docker_client.containers.get(target_container.container_id)
+    try:
+        claimed_container.rename(target_container.container_name)
+        claimed_container.start()
+    except Exception:
+        # Remove broken container, so that its ports can be bound by a new container
+        try:
+            claimed_container.remove(force=True)
+        except Exception:
+            pass
+        raise
+
+    try:
+        ddc_provisioner.push_setup_script(target_container, target_container.start_image_name.split(':')[0])
+    except Exception as err:
+        # Container is usable even if setup script is not pushed
+        print(utils.get_traceback_msg(err))
+
+
+def give_back(image_name: str, pool_entry: dict[str, typing.Any]):
+    redis_db.lpush(get_pool_key(image_name), json.dumps(pool_entry))
+
+
+def replenish(pool_size: int) -> int:
+    '''Fill warm pools of all whitelisted images up to pool_size. Returns number of created containers.'''
+    # Only one process replenishes pools at a time, otherwise pools will be overfilled.
+    lock_token = ddc_redis_lock.acquire(replenish_lock_key, replenish_lock_timeout)
+    if not lock_token:
+        return 0
+
+    created_count = 0
+    try:
+        for image_name in get_pool_image_names():
+            for _ in range(pool_size - redis_db.llen(get_pool_key(image_name))):
+                try:
+                    create_warm_container(image_name)
+                    created_count += 1
+                except Exception as err:
+                    print(utils.get_traceback_msg(err))
+                    break
+    finally:
+        ddc_redis_lock.release(replenish_lock_key, lock_token)
+
+    return created_count
+
+
+class WarmPoolReplenisher:
+    '''Thread that replenishes warm pools periodically, or right after a warm container is claimed.'''
+    def __init__(self, pool_size: int, interval: float):
+        self.pool_size: int = pool_size
+        self.interval: float = interval
+
+        self._thread: typing.Optional[threading.Thread] = None
+        self._wake_event: threading.Event = threading.Event()
+        self._stop_event: threading.Event = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.replenish_loop, name='container-warm-pool', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: typing.Optional[float] = None):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        self._wake_event.set()
+
+    def replenish_loop(self):
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            try:
+                replenish(self.pool_size)
+            except Exception as err:
+                print(utils.get_traceback_msg(err))
+            self._wake_event.wait(self.interval)
+
+
+replenisher: typing.Optional[WarmPoolReplenisher] = None
+
+
+def request_replenish():
+    if replenisher is not None:
+        replenisher.wake()
+
+
+def init_app(app: flask.Flask):
+    pool_size = app.config.get('CONTAINER_WARM_POOL_SIZE', 0)
+    if pool_size <= 0:
+        return
+
+    @app.before_first_request
+    def start_replenisher():
+        global replenisher
+        if replenisher is None:
+            replenisher = WarmPoolReplenisher(pool_size, app.config.get('CONTAINER_WARM_POOL_INTERVAL', 30.0))
+            replenisher.start()